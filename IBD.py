@@ -6,7 +6,11 @@ Date: 10/27/19
 # DONE
 
 # python imports
+import itertools
 import json
+
+# our imports
+import compressed
 #from tqdm import tqdm
 
 class IBD:
@@ -107,40 +111,139 @@ class IBD:
     def __hash__(self):
         return hash(self.id)
 
-def get_IBDs(germ_filename, left_out):
+def get_IBDs(germ_filenames, left_out, merge_gap=None):
+    """
+    From each GERMLINE file (one file name or a list), read IBDs and return a
+    list of all IBDs. Can optionally leave out some individuals, and merge
+    nearby segments of the same pair first (see merge_segments).
+    """
+    if type(germ_filenames) == str:
+        return read_germline(germ_filenames, left_out, merge_gap)
+
+    # pairs sharing an IBD may be split across files, so group all lines
+    def lines():
+        for germ_file in germ_filenames: # can tqdm
+            g_file = compressed.open_input(germ_file)
+            for line in g_file:
+                yield line
+            g_file.close()
+    return group_germline(lines(), left_out, merge_gap)
+
+def index_chromosomes(germ_filenames):
+    """
+    Finds the lines of each chromosome in GERMLINE files (plain or
+    compressed) without keeping them. Returns a dictionary of chromosome ->
+    list of runs of lines, each as (file name, offset, length) (see
+    compressed.read_offset_lines).
+    """
+    runs = {}
+    for germ_file in germ_filenames:
+        pos = 0 # uncompressed position
+        ends = {} # chromosome -> uncompressed end of its last run
+        for offset, length, line in compressed.read_offset_lines(germ_file):
+            tokens = line.split()
+            if len(tokens) > 4:
+                chrom = int(tokens[4])
+                if chrom not in runs:
+                    runs[chrom] = []
+                # extend the last run if this line follows it
+                if ends.get(chrom) == pos:
+                    last = runs[chrom][-1]
+                    runs[chrom][-1] = (germ_file, last[1], last[2] + length)
+                else:
+                    runs[chrom].append((germ_file, offset, length))
+                ends[chrom] = pos + length
+            pos += length
+    return runs
+
+def read_chromosome(runs, left_out, merge_gap=None):
     """
-    From each GERMLINE file, read IBDs and return a list of all IBDs. Can
-    optionally leave out some individuals.
+    Reads the IBDs of a single chromosome from its runs of lines (see
+    index_chromosomes), and creates a list of IBD instances.
     """
-    # TODO no longer using multiple GERMLINE files at once, can remove function
-    #IBDs = []
-    #for germ_file in germ_files: # can tqdm
-    return read_germline(germ_filename, left_out)
+    def lines():
+        # each file's runs are read in one pass through the file
+        for germ_file, file_runs in itertools.groupby(runs, lambda run: run[0]):
+            ranges = [(offset, length) for name, offset, length in file_runs]
+            for data in compressed.read_ranges(germ_file, ranges):
+                for line in data.decode().splitlines():
+                    yield line
+    return group_germline(lines(), left_out, merge_gap)
+
+def read_germline(germ_file, left_out, merge_gap=None):
+    """
+    Reads a germline .match file (plain, gzip or bgzip compressed), and
+    creates a list of IBD instances.
+    """
+    g_file = compressed.open_input(germ_file)
+    IBDs = group_germline(g_file, left_out, merge_gap)
+    g_file.close()
+    return IBDs
+
+def read_segments(lines):
+    """
+    Yields (chromosome, start, end, SNPs, genetic distance, individual 1,
+    individual 2) for each line of a germline .match file.
+    """
+    for line in lines:
+        tokens = line.strip().split()
+        # individuals are ids with their haplotype (ie 52.1)
+        yield int(tokens[4]), int(tokens[5]), int(tokens[6]), \
+            int(tokens[9]), float(tokens[10]), tokens[1], tokens[3]
 
-def read_germline(germ_file, left_out):
+def merge_segments(segments, merge_gap):
     """
-    Reads a germline .match file, and creates a list of IBD instances.
+    Merges segments (see read_segments) of the same pair of haplotypes that
+    overlap or are at most merge_gap base pairs apart, since GERMLINE can
+    report one shared haplotype as several pieces. Each pair's segments on a
+    chromosome are sorted by start and swept once. A merged segment spans its
+    pieces, and its SNPs and genetic distance add up theirs, with overlapping
+    stretches counted once (in proportion to their length). Pairs are yielded
+    in the order they are first seen.
+    """
+    pairs = {} # (chromosome, haplotype pair) -> segments
+    for segment in segments:
+        key = (segment[0],) + tuple(sorted(segment[5:]))
+        if key not in pairs:
+            pairs[key] = []
+        pairs[key].append(segment)
+
+    for pair_segments in pairs.values():
+        pair_segments.sort(key=lambda segment: (segment[1], segment[2]))
+        chrom, start, end, num_snps, genetic_dist, indv1, indv2 = pair_segments[0]
+        for segment in pair_segments[1:]:
+            if segment[1] > end + merge_gap:
+                yield chrom, start, end, num_snps, genetic_dist, indv1, indv2
+                start, end, num_snps, genetic_dist = segment[1:5]
+            elif segment[2] > end:
+                # only count the part past the merged segment so far
+                past = (segment[2] - max(segment[1], end)) / \
+                    max(segment[2] - segment[1], 1)
+                num_snps += round(segment[3] * past)
+                genetic_dist += segment[4] * past
+                end = segment[2]
+        yield chrom, start, end, num_snps, genetic_dist, indv1, indv2
+
+def group_germline(lines, left_out, merge_gap=None):
+    """
+    Groups the pairs of individuals on lines of a germline .match file into
+    cohorts sharing each IBD, and creates a list of IBD instances. If
+    merge_gap (base pairs) is given, nearby segments of the same pair are
+    merged first (see merge_segments).
     """
     IBDs = []
     # IBD -> lists of pairs of individual ids (ie 52.1) sharing the IBDs
     IBD_set = {}
 
-    g_file = open(germ_file, "r")
-    for line in g_file:
-        tokens = line.strip().split()
+    segments = read_segments(lines)
+    if merge_gap != None:
+        segments = merge_segments(segments, merge_gap)
+
+    for chrom, start, end, num_snps, genetic_dist, indv1, indv2 in segments:
         # "skeleton" IBD, contains all details but no individuals, since
         # multiple IBDs can have the same skeleton
-        chrom = int(tokens[4])
-        start = int(tokens[5])
-        end = int(tokens[6])
-        num_snps = int(tokens[9])
-        genetic_dist = float(tokens[10])
         skeleton = IBD(chrom, start, end, num_snps, genetic_dist)
 
-        # find pair of individuals
-        indv1 = tokens[1] # str
-        indv2 = tokens[3] # str
-
         if skeleton not in IBD_set:
             IBD_set[skeleton] = [[indv1, indv2]]
         else:
@@ -200,7 +303,7 @@ def read_germline(germ_file, left_out):
             IBDs.append(ibd)
     return IBDs
 
-def ibd_to_indvs(ibds, ped):
+def ibd_to_indvs(ibds, ped, fast=True):
     """Assign individuals IBDs (not currently accounting for homozygous)"""
 
     # give individuals ibds
@@ -238,11 +341,13 @@ def ibd_to_indvs(ibds, ped):
         #    ibd.set_hap(parent_id, -1)
 
     # separate ibds (in cases when parents are genotyped), not super necessary
-    separate_ibds(ped)
+    if fast:
+        separate_ibds_fast(ped)
+    else:
+        separate_ibds(ped)
 
 def separate_ibds(ped):
     """Assign IBD lists to proper parents based on number of shared IBDs"""
-    THRESHOLD = 2
 
     # go through each individual, one at a time
     for indv in ped.genotyped:
@@ -269,26 +374,107 @@ def separate_ibds(ped):
             shared_m_1 = len(m_ibds & indv.get_IBDs("11"))
             shared_m_2 = len(m_ibds & indv.get_IBDs("21"))
 
-            # ibds["11"] are paternal and ibds["21"] are maternal, do nothing
-            if shared_p_1 > shared_p_2 and shared_m_1 < shared_m_2:
-                continue
+            resolve_parents(indv, shared_p_1, shared_p_2, shared_m_1, \
+                shared_m_2)
+
+def separate_ibds_fast(ped):
+    """
+    Same as separate_ibds, but builds the union of each parent's IBD lists
+    once and reuses it for all of their children, instead of building fresh
+    unions of both parents' lists for every individual.
+    """
+    unions = {} # parent -> "01" | "11" | "21" IBDs
+    moved = set()
+
+    def parent_ibds(parent):
+        # parents moved earlier only have "01" IBDs left
+        if parent in moved:
+            return parent.get_IBDs("01")
+        if parent not in unions:
+            unions[parent] = parent.get_IBDs("01") | parent.get_IBDs("11") | \
+                parent.get_IBDs("21")
+        return unions[parent]
+
+    # same order and decisions as separate_ibds
+    for indv in ped.genotyped:
+        if indv == "0":
+            continue
+
+        if indv.married_in or indv.founder: # we can't know parents' haplotypes
+            indv.move_IBDs() # move 1/2 to 3/4
+            moved.add(indv)
+            continue
+
+        m = indv.m
+        p = indv.p
+        if p.genotyped == True and m.genotyped == True:
+
+            p_ibds = parent_ibds(p)
+            shared_p_1 = len(p_ibds & indv.get_IBDs("11"))
+            shared_p_2 = len(p_ibds & indv.get_IBDs("21"))
+
+            m_ibds = parent_ibds(m)
+            shared_m_1 = len(m_ibds & indv.get_IBDs("11"))
+            shared_m_2 = len(m_ibds & indv.get_IBDs("21"))
+
+            if resolve_parents(indv, shared_p_1, shared_p_2, shared_m_1, \
+                shared_m_2):
+                moved.add(indv)
+
+def resolve_parents(indv, shared_p_1, shared_p_2, shared_m_1, shared_m_2):
+    """
+    Swap or move an individual's IBD lists based on the number of IBDs each
+    list shares with each parent. Returns True if lists were moved to 3/4.
+    """
+    THRESHOLD = 2
 
-            # ibds["21"] are paternal & ibds["11"] are maternal, swap ibd lists
-            elif shared_p_1 < shared_p_2 and shared_m_1 > shared_m_2:
-                indv.swap_IBDs() # swap 1&2
-                continue
+    # ibds["11"] are paternal and ibds["21"] are maternal, do nothing
+    if shared_p_1 > shared_p_2 and shared_m_1 < shared_m_2:
+        return False
 
-            # haplotype parents inconclusive
-            else:
+    # ibds["21"] are paternal & ibds["11"] are maternal, swap ibd lists
+    elif shared_p_1 < shared_p_2 and shared_m_1 > shared_m_2:
+        indv.swap_IBDs() # swap 1&2
+        return False
 
-                p_dif = shared_p_1 - shared_p_2
-                m_dif = shared_m_1 - shared_m_2
+    # haplotype parents inconclusive
+    else:
 
-                if p_dif > THRESHOLD * m_dif:
-                    continue
-                elif m_dif > THRESHOLD * p_dif:
-                    indv.swap_IBDs() # swap 1&2
-                    continue
-                else:
-                    # still inconclusive
-                    indv.move_IBDs() # 1/2 to 3/4
+        p_dif = shared_p_1 - shared_p_2
+        m_dif = shared_m_1 - shared_m_2
+
+        if p_dif > THRESHOLD * m_dif:
+            return False
+        elif m_dif > THRESHOLD * p_dif:
+            indv.swap_IBDs() # swap 1&2
+            return False
+        else:
+            # still inconclusive
+            indv.move_IBDs() # 1/2 to 3/4
+            return True
+
+def resolved_haps(ibd, ped):
+    """
+    Returns a dictionary of the ids of individuals sharing an IBD whose copy
+    of it was resolved to their father's ("11") or mother's ("21") haplotype
+    by separate_ibds. Individuals without both parents genotyped (whose
+    lists are never resolved), with unresolved lists or who are homozygous
+    for the IBD are left out.
+    """
+    haps = {}
+    for indv_id in ibd.get_indvs():
+        if not indv_id in ped.indvs: # check for pedigree subsets
+            continue
+        indv = ped.indvs[indv_id]
+        if indv.married_in or indv.founder or indv.parents == None or \
+            str(indv.parents) == "0":
+            continue
+        if not (indv.p.genotyped and indv.m.genotyped):
+            continue
+        paternal = ibd in indv.get_IBDs("11")
+        maternal = ibd in indv.get_IBDs("21")
+        if paternal and not maternal:
+            haps[indv_id] = "11"
+        elif maternal and not paternal:
+            haps[indv_id] = "21"
+    return haps
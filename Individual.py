@@ -79,10 +79,17 @@ class Individual:
             return self._IBDs[key]
 
     def descendants(self):
-        """Return a set of descendants of this individual (recursive)"""
-        descend = set(self.children)
-        for c in self.children:
-            descend |= c.descendants()
+        """
+        Return a set of descendants of this individual (see also
+        PedigreeTree.descendants for repeated use)
+        """
+        descend = set()
+        stack = list(self.children)
+        while len(stack) != 0:
+            c = stack.pop()
+            if c not in descend:
+                descend.add(c)
+                stack.extend(c.children)
         return descend
 
     # SETTERS
@@ -39,6 +39,20 @@ class PedigreeTree:
         self.genotyped = set()
         self.indvs = self.construct_individuals(ped_data[1:])
         self.find_relations()
+        self.families = self.find_families() # id -> family number
+
+        # descendant index (see build_descendant_index), built when needed
+        self.index = None
+        self.index_ids = None
+        self.desc_bits = None
+
+        # id -> frozenset of the id and its ancestors (see ancestors)
+        self.ancestor_sets = {}
+
+        # chains of single-line lineages (see compress_chains)
+        self.chain_tops = {} # id in a chain -> Individual at the top of it
+        self.chain_spouses = set() # ids of married-in spouses in chains
+        self.chain_members = {} # top id -> ids of the rest of the chain
 
     def construct_individuals(self, ped_data):
         """
@@ -123,6 +137,198 @@ class PedigreeTree:
         self.recursive_find_relations(indv.p)
         self.recursive_find_relations(indv.m)
 
+    def find_families(self):
+        """
+        Labels each individual with the number of its family: the connected
+        part of the pedigree (through parents and children) it is in.
+        Returns a dictionary of ids to family numbers.
+        """
+        links = {} # id -> id of another individual in the same family
+        def find(id):
+            while links[id] != id:
+                links[id] = links[links[id]]
+                id = links[id]
+            return id
+
+        for id in self.indvs:
+            if id != "0":
+                links[id] = id
+        for id, indv in self.indvs.items():
+            if id == "0":
+                continue
+            for parent_id in [indv.p_id, indv.m_id]:
+                if parent_id in links:
+                    links[find(parent_id)] = find(id)
+
+        families = {}
+        numbers = {} # family root id -> family number
+        for id in links:
+            root = find(id)
+            if not root in numbers:
+                numbers[root] = len(numbers)
+            families[id] = numbers[root]
+        return families
+
+    def family_of(self, indvs):
+        """
+        Takes list of individual ids (strings) and returns the number of the
+        family (see find_families) they are all in, or None if they are in
+        more than one family or none are in the pedigree (then they can have
+        no shared ancestors). Individuals not in the pedigree are ignored.
+        """
+        family = None
+        for indv in indvs:
+            if indv in self.families:
+                if family == None:
+                    family = self.families[indv]
+                elif self.families[indv] != family:
+                    return None
+        return family
+
+    def build_descendant_index(self):
+        """
+        Indexes the descendants of every individual once, working up from
+        individuals with no children so each set is only built from its
+        children's sets. Every individual gets a bit position (descendants
+        always before ancestors) and a bitset of its descendants stored as
+        (lowest bit position, int of bits from that position). The index is
+        only kept once complete, in case a search timeout interrupts it.
+        """
+        index = {} # id -> bit position
+        index_ids = [] # bit position -> id
+        desc_bits = {} # id -> (lowest bit position, bits)
+
+        remaining = {} # id -> number of children not yet indexed
+        ready = []
+        for id_num, indv in self.indvs.items():
+            if id_num == "0":
+                continue
+            remaining[id_num] = len(indv.children)
+            if remaining[id_num] == 0:
+                ready.append(indv)
+
+        while len(ready) != 0:
+            indv = ready.pop()
+            pos = len(index_ids)
+
+            # union of children and their descendants (starting at the
+            # individual's own position if there are none, so parents'
+            # bits start no lower than their lowest descendant)
+            low = None
+            for child in indv.children:
+                child_low = min(desc_bits[child.id][0], \
+                    index[child.id])
+                if low == None or child_low < low:
+                    low = child_low
+            bits = 0
+            for child in indv.children:
+                child_low, child_bits = desc_bits[child.id]
+                bits |= child_bits << (child_low - low)
+                bits |= 1 << (index[child.id] - low)
+            if low == None:
+                low = pos
+            desc_bits[indv.id] = (low, bits)
+
+            index[indv.id] = pos
+            index_ids.append(indv.id)
+
+            # parents are ready once all of their children are indexed
+            # (a parent of a single-parent record has no child edge to it)
+            for parent in [indv.p, indv.m]:
+                if parent == "0" or parent == None or \
+                    not indv in parent.children:
+                    continue
+                remaining[parent.id] -= 1
+                if remaining[parent.id] == 0:
+                    ready.append(parent)
+
+        self.index = index
+        self.index_ids = index_ids
+        self.desc_bits = desc_bits # set last, checked before use
+
+    def descendants(self, indv_id):
+        """Return a set of ids of the descendants of an individual"""
+        if self.desc_bits == None:
+            self.build_descendant_index()
+        low, bits = self.desc_bits[indv_id]
+        # bits as a string, lowest position first
+        bit_str = bin(bits)[:1:-1]
+        return {self.index_ids[low + i] for i in range(len(bit_str)) \
+            if bit_str[i] == "1"}
+
+    def is_descendant(self, desc_id, anc_id):
+        """Return True if desc_id is a descendant of anc_id"""
+        if self.desc_bits == None:
+            self.build_descendant_index()
+        low, bits = self.desc_bits[anc_id]
+        pos = self.index[desc_id]
+        return pos >= low and (bits >> (pos - low)) & 1 == 1
+
+    def ancestors(self, indv_id):
+        """
+        Return a frozenset of the ids of an individual and its ancestors,
+        kept for later calls (cohort members are asked for many times)
+        """
+        if not indv_id in self.ancestor_sets:
+            found = {indv_id}
+            stack = [self.indvs[indv_id]]
+            while len(stack) > 0:
+                indv = stack.pop()
+                if indv.parents == None or str(indv.parents) == "0":
+                    continue
+                for parent in (indv.p, indv.m):
+                    if not parent.id in found:
+                        found.add(parent.id)
+                        stack.append(parent)
+            self.ancestor_sets[indv_id] = frozenset(found)
+        return self.ancestor_sets[indv_id]
+
+    def compress_chains(self, genotyped=None):
+        """
+        Finds chains of ungenotyped individuals that each have one child
+        with a married-in spouse (also ungenotyped, with no other children),
+        such as a single line of descent through several generations. None
+        of them can be a source or in a cohort, so find_collective_ca_sweep
+        climbs from the child below a chain straight to the individual at
+        the top of it, whose node stands for the whole chain, and skips the
+        married-in spouses. chain_members gives the ids the top stands for,
+        to add back to SubPedigree members (the top's parents and the
+        bottom's spouse are added with the parents of path members as usual).
+        genotyped: ids that can be in cohorts (default: self.genotyped)
+        """
+        if genotyped == None:
+            genotyped = {indv.id for indv in self.genotyped}
+
+        links = {} # id -> spouse of each individual that can be in a chain
+        for id, indv in self.indvs.items():
+            if id == "0" or id in genotyped or indv.parents == None or \
+                str(indv.parents) == "0":
+                continue
+            if len(indv.couples) != 1 or len(indv.children) != 1:
+                continue
+            couple = indv.couples[0]
+            spouse = couple.m if couple.p.id == id else couple.p
+            if spouse.married_in and not spouse.id in genotyped and \
+                len(spouse.couples) == 1:
+                links[id] = spouse
+
+        self.chain_tops = {}
+        self.chain_spouses = set()
+        self.chain_members = {}
+        for id in links:
+            indv = self.indvs[id]
+            if indv.p_id in links or indv.m_id in links:
+                continue # not the top of its chain
+            members = []
+            while indv.id in links:
+                self.chain_tops[indv.id] = self.indvs[id]
+                self.chain_spouses.add(links[indv.id].id)
+                members.append(links[indv.id].id)
+                if indv.id != id:
+                    members.append(indv.id)
+                indv = indv.children[0]
+            self.chain_members[id] = members
+
     def trim_redundant_ancestors(self,ancestor_tree, cohort, verbose=False):
         """
         helper method for find_collective_ca
@@ -197,14 +403,37 @@ class PedigreeTree:
             tree[indv.m.id].cohort.extend(cohort)
             self.propogate_cohort(tree, indv.m, cohort)
 
-    def find_collective_ca(self, indvs, verbose=False):
+    def climbed_parents(self, indv, haps):
+        """
+        helper method for find_collective_ca
+        returns the parents of indv the ancestor search continues to: only
+        the father if haps (id -> "11" or "21") says indv inherited the IBD
+        from their father, only the mother if from their mother, else both
+        """
+        if haps != None and haps.get(indv.id) == "11":
+            return [indv.p]
+        if haps != None and haps.get(indv.id) == "21":
+            return [indv.m]
+        return [indv.p, indv.m]
+
+    def find_collective_ca(self, indvs, verbose=False, bound=None, fast=True, \
+        haps=None):
         """
         Takes list of individual ids (strings) and returns the common ancestor
         of the individuals if one exists, otherwise returns all common
         ancestors if multiple exist
+        bound: optional set of ids the search is kept within (should be
+        closed under descendants, e.g. everything below a chosen source)
+        fast: use find_collective_ca_sweep (same sources, but node cohorts
+        hold each cohort individual once)
+        haps: optional dictionary of ids to the parental haplotype ("11"
+        paternal, "21" maternal) the IBD is on (see IBD.resolved_haps); the
+        search only climbs that parent's lineage above those individuals
         ASSUMPTION: no married-ins are closely related
         """
-        # TODO use haplotype values from indvs to be more specific?
+        if fast:
+            return self.find_collective_ca_sweep(indvs, verbose, bound, haps)
+
         ancestor_tree = {} # ancestor id -> AncestorNode
         queue = [] # next individuals to track
 
@@ -229,7 +458,12 @@ class PedigreeTree:
                 continue
 
             # add to parent nodes
-            if indv.p.id not in ancestor_tree.keys():
+            climbed = self.climbed_parents(indv, haps)
+            if indv.p not in climbed:
+                pass # IBD was inherited from the mother
+            elif bound != None and indv.p.id not in bound:
+                pass # father is outside the searched region
+            elif indv.p.id not in ancestor_tree.keys():
                 # parent node has not been created, initialize parent node
                 ancestor_tree[indv.p.id] = AncestorNode(indv.p, \
                     curr_node.cohort, curr_node)
@@ -242,7 +476,11 @@ class PedigreeTree:
                 ancestor_tree[indv.p.id].add_child(curr_node)
                 self.propogate_cohort(ancestor_tree, indv.p, curr_node.cohort)
 
-            if indv.m.id not in ancestor_tree.keys():
+            if indv.m not in climbed:
+                pass # IBD was inherited from the father
+            elif bound != None and indv.m.id not in bound:
+                pass # mother is outside the searched region
+            elif indv.m.id not in ancestor_tree.keys():
                 # parent node has not been created, initialize parent node
                 ancestor_tree[indv.m.id] = AncestorNode(indv.m, \
                     curr_node.cohort, curr_node)
@@ -269,6 +507,82 @@ class PedigreeTree:
 
         return sources
 
+    def find_collective_ca_sweep(self, indvs, verbose=False, bound=None, haps=None):
+        """
+        Same sources as find_collective_ca, but collects the cohort's ancestors
+        first and then visits each of them once in generation order (children
+        before parents), instead of re-propagating cohorts upwards whenever an
+        ancestor is reached again. Each node keeps a bitmask of the cohort
+        individuals below it and its number of paths down to them (what the
+        length of a node's cohort list is in find_collective_ca), so redundant
+        ancestors are trimmed in one pass. Node cohorts list each individual
+        once. Chains found by compress_chains are climbed in one step.
+        """
+        members = [] # cohort individuals in the pedigree
+        member_bits = {} # id -> bit of a cohort individual
+        for indv in indvs:
+            if indv in self.indvs and not indv in member_bits: # check for pedigree subsets
+                member_bits[indv] = 1 << len(members)
+                members.append(self.indvs[indv])
+
+        # collect the ancestors (within bound) of the cohort
+        ancestor_tree = {} # ancestor id -> AncestorNode
+        visits = {} # ancestor id -> [parents in ancestor_tree, bitmask of
+                    # cohort individuals below it, number of paths to them]
+        chains = len(self.chain_tops) != 0
+        stack = list(members)
+        for indv in members:
+            ancestor_tree[indv.id] = AncestorNode(indv, [])
+            visits[indv.id] = [[], member_bits[indv.id], 1]
+        while len(stack) != 0:
+            indv = stack.pop()
+            # check if married in
+            if indv.parents == None:
+                continue
+            climbed = (indv.p, indv.m)
+            if haps != None:
+                climbed = self.climbed_parents(indv, haps)
+            up = visits[indv.id][0]
+            for parent in climbed:
+                if chains:
+                    if parent.id in self.chain_spouses:
+                        continue # married-in spouse in a chain, no ancestors
+                    # continue from the top of a chain
+                    parent = self.chain_tops.get(parent.id, parent)
+                if bound != None and parent.id not in bound:
+                    continue # parent is outside the searched region
+                if parent.id not in visits:
+                    ancestor_tree[parent.id] = AncestorNode(parent, [])
+                    visits[parent.id] = [[], 0, 0]
+                    stack.append(parent)
+                up.append(parent.id)
+
+        # visit the ancestors in generation order (descendants first, see
+        # build_descendant_index), passing each one's cohort up to its parents
+        if self.desc_bits == None:
+            self.build_descendant_index()
+        for id in sorted(ancestor_tree, key=self.index.__getitem__):
+            node = ancestor_tree[id]
+            up, mask, paths = visits[id]
+            node.cohort = [members[i] for i in range(len(members)) if mask >> i & 1]
+            for parent_id in up:
+                ancestor_tree[parent_id].children.append(node)
+                parent_visit = visits[parent_id]
+                parent_visit[1] |= mask
+                parent_visit[2] += paths
+
+        # keep ancestors of the whole cohort with paths not all through one child
+        full_mask = (1 << len(members)) - 1
+        sources = {}
+        for id, node in ancestor_tree.items():
+            visit = visits[id]
+            if visit[1] == full_mask and len(node.children) > 0 and \
+                visit[2] > max(visits[child.indv.id][2] for child in node.children):
+                sources[id] = node
+
+        # if a married pair is a source, treat them as a unit
+        return self.combine_couples(sources)
+
     def descendence_paths(self, sources, cohort):
         """
         Returns list of sources separated into all possible descendence paths.
@@ -397,9 +711,6 @@ class PedigreeTree:
             final.append(new_path)
         return final
 
-    # TODO make method to create entire descendence array once instead of
-    # multiple times
-
 # TODO move the functions below somewhere else (different file or inside class)
 
 def find_num_desc_paths(cohort):
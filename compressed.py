@@ -0,0 +1,283 @@
+"""
+Reading and writing of plain, gzip and bgzip (BGZF) compressed text files.
+BGZF files are made of independent gzip blocks, so their blocks are
+decompressed in a pool of threads and streamed back in order.
+"""
+
+# python imports
+import gzip
+import zlib
+import struct
+import collections
+import concurrent.futures
+
+THREADS = 4 # threads decompressing BGZF blocks
+AHEAD = 64 # BGZF blocks decompressed ahead of the reader
+BLOCK_SIZE = 65280 # uncompressed bytes per written BGZF block
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+def file_type(filename):
+    """Returns "bgzf", "gzip" or "plain" based on the start of a file"""
+    in_file = open(filename, "rb")
+    header = in_file.read(18)
+    in_file.close()
+    if header[:2] != b"\x1f\x8b":
+        return "plain"
+    # BGZF has an extra field with a "BC" subfield holding the block size
+    if len(header) == 18 and header[3] & 4 and header[12:14] == b"BC":
+        return "bgzf"
+    return "gzip"
+
+def read_blocks(filename, start=0, threads=THREADS, wanted=None):
+    """
+    Yields (compressed offset, uncompressed data) for each block of a BGZF
+    file, starting at the block at compressed offset start. If given,
+    wanted(compressed offset, uncompressed size) is called for each block
+    in order, and blocks it returns False for are skipped without being
+    decompressed.
+    """
+    in_file = open(filename, "rb")
+    in_file.seek(start)
+    pool = concurrent.futures.ThreadPoolExecutor(threads)
+    pending = collections.deque()
+    offset = start
+    try:
+        while True:
+            header = in_file.read(12)
+            if len(header) < 12:
+                break
+            xlen = struct.unpack("<H", header[10:12])[0]
+            extra = in_file.read(xlen)
+            # find the total block size in the "BC" subfield
+            block_size = None
+            i = 0
+            while i < xlen:
+                slen = struct.unpack("<H", extra[i+2:i+4])[0]
+                if extra[i:i+2] == b"BC":
+                    block_size = struct.unpack("<H", extra[i+4:i+6])[0] + 1
+                i += 4 + slen
+            if block_size == None:
+                raise ValueError(filename + " is not a bgzip file")
+            data = in_file.read(block_size - 12 - xlen)
+            if wanted != None and not wanted(offset, struct.unpack("<I", data[-4:])[0]):
+                offset += block_size
+                continue
+            # raw deflate data is followed by the crc and size (8 bytes)
+            pending.append((offset, pool.submit(zlib.decompress, data[:-8], -15)))
+            offset += block_size
+
+            if len(pending) >= AHEAD:
+                block_offset, future = pending.popleft()
+                yield block_offset, future.result()
+        while len(pending) != 0:
+            block_offset, future = pending.popleft()
+            yield block_offset, future.result()
+    finally:
+        in_file.close()
+        pool.shutdown(cancel_futures=True)
+
+class BGZFLines:
+    """
+    Iterates over the lines (strs) of a BGZF file, decompressing its
+    blocks in parallel. Can be used in place of an open text file.
+    """
+    def __init__(self, filename, threads=THREADS):
+        self.lines = self.read_lines(filename, threads)
+
+    def read_lines(self, filename, threads):
+        rest = b""
+        for offset, data in read_blocks(filename, 0, threads):
+            lines = (rest + data).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                yield line.decode() + "\n"
+        if rest:
+            yield rest.decode()
+
+    def __iter__(self):
+        return self.lines
+
+    def __next__(self):
+        return next(self.lines)
+
+    def readlines(self):
+        return list(self.lines)
+
+    def close(self):
+        self.lines.close()
+
+def open_input(filename):
+    """
+    Opens a plain, gzip or BGZF text file for reading
+    (iterating over lines, readlines and close)
+    """
+    kind = file_type(filename)
+    if kind == "bgzf":
+        return BGZFLines(filename)
+    if kind == "gzip":
+        return gzip.open(filename, "rt")
+    return open(filename, "r")
+
+def read_offset_lines(filename):
+    """
+    Yields (offset, length, line) for each line (bytes) of a plain, gzip or
+    BGZF file, where offset can be given to read_range to read from the
+    start of the line. Offsets are byte offsets for plain files,
+    uncompressed offsets for gzip files and virtual offsets (compressed
+    block offset << 16 | offset in block) for BGZF files.
+    """
+    kind = file_type(filename)
+    if kind == "bgzf":
+        rest = b""
+        rest_offset = None
+        for block_offset, data in read_blocks(filename):
+            if rest_offset == None:
+                rest_offset = block_offset << 16
+            pos = 0
+            while True:
+                end = data.find(b"\n", pos)
+                if end == -1:
+                    break
+                line = rest + data[pos:end+1]
+                yield rest_offset, len(line), line
+                rest = b""
+                pos = end + 1
+                rest_offset = (block_offset << 16) | pos
+            rest += data[pos:]
+            # a line starting at the very end of a block starts in the next
+            if len(rest) == 0:
+                rest_offset = None
+        if rest:
+            yield rest_offset, len(rest), rest
+        return
+
+    if kind == "gzip":
+        in_file = gzip.open(filename, "rb")
+    else:
+        in_file = open(filename, "rb")
+    pos = 0
+    for line in in_file:
+        yield pos, len(line), line
+        pos += len(line)
+    in_file.close()
+
+def read_range(filename, offset, length):
+    """
+    Reads length uncompressed bytes from an offset given by
+    read_offset_lines.
+    """
+    return next(read_ranges(filename, [(offset, length)]))
+
+def read_ranges(filename, ranges):
+    """
+    Yields the data of each (offset, length) range in a list of ranges
+    from read_offset_lines, in order of their offsets, reading the file
+    once instead of from its start for each range.
+    """
+    kind = file_type(filename)
+    if kind == "bgzf":
+        yield from read_bgzf_ranges(filename, ranges)
+        return
+
+    if kind == "gzip":
+        in_file = gzip.open(filename, "rb")
+    else:
+        in_file = open(filename, "rb")
+    try:
+        for offset, length in ranges:
+            # gzip files seek forward by decompressing only the bytes in between
+            in_file.seek(offset)
+            yield in_file.read(length)
+    finally:
+        in_file.close()
+
+def read_bgzf_ranges(filename, ranges):
+    """
+    read_ranges for BGZF files. Only the blocks holding part of a range
+    are decompressed, found from the uncompressed size stored at the end
+    of each block.
+    """
+    if len(ranges) == 0:
+        return
+    todo = collections.deque(ranges)
+    left = None # bytes of the first range in todo from the start of this block
+
+    def wanted(block_offset, size):
+        nonlocal left
+        want = False
+        while len(todo) != 0:
+            offset, length = todo[0]
+            if left == None:
+                if block_offset < offset >> 16:
+                    return want
+                left = (offset & 0xFFFF) + length
+            want = True
+            if left > size:
+                left -= size
+                return want
+            # the range ends in this block, the next one may start in it
+            todo.popleft()
+            left = None
+        return want
+
+    blocks = read_blocks(filename, ranges[0][0] >> 16, wanted=wanted)
+    try:
+        block_offset, block = next(blocks)
+        for offset, length in ranges:
+            while block_offset != offset >> 16:
+                block_offset, block = next(blocks)
+            pos = offset & 0xFFFF
+            data = []
+            while True:
+                data.append(block[pos:pos+length])
+                length -= len(data[-1])
+                if length <= 0:
+                    break
+                block_offset, block = next(blocks)
+                pos = 0
+            yield b"".join(data)
+    finally:
+        blocks.close()
+
+class BGZFWriter:
+    """
+    Writes text to a BGZF file (readable by any gzip reader, and
+    by bgzip/tabix), one block at a time.
+    """
+    def __init__(self, filename):
+        self.out_file = open(filename, "wb")
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, text):
+        self.buffer.append(text.encode())
+        self.buffered += len(self.buffer[-1])
+        if self.buffered >= BLOCK_SIZE:
+            data = b"".join(self.buffer)
+            while len(data) >= BLOCK_SIZE:
+                self.write_block(data[:BLOCK_SIZE])
+                data = data[BLOCK_SIZE:]
+            self.buffer = [data]
+            self.buffered = len(data)
+
+    def write_block(self, data):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        deflated = compressor.compress(data) + compressor.flush()
+        # header with "BC" subfield holding the total block size - 1
+        header = struct.pack("<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, \
+            66, 67, 2, len(deflated) + 25)
+        self.out_file.write(header + deflated + \
+            struct.pack("<II", zlib.crc32(data), len(data)))
+
+    def close(self):
+        data = b"".join(self.buffer)
+        if len(data) > 0:
+            self.write_block(data)
+        self.out_file.write(BGZF_EOF)
+        self.out_file.close()
+
+def open_output(filename, compress=False):
+    """Opens a text file for writing, bgzip compressed if compress is True"""
+    if compress:
+        return BGZFWriter(filename)
+    return open(filename, "w")
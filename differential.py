@@ -0,0 +1,482 @@
+"""
+Differential harness for the sub-pedigree search. Generates random
+pedigrees (with loops, remarriages and partial genotyping) and random
+IBD cohorts, runs every stage through its reference implementation and
+each alternative engine registered in ENGINES, asserts that they give
+identical answers and reports each engine's time relative to the reference.
+
+Alternative engines are registered by adding a (name, function) pair to
+a stage in ENGINES. Every function for a stage takes the same input
+(see INPUTS) and returns a comparable answer.
+
+python3 differential.py [-n pedigrees] [--seed seed] [--stage stage]
+    [--founders couples] [--generations generations]
+"""
+
+#python imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+#local imports
+from PedigreeTree import PedigreeTree
+import ped_cohort
+
+def random_pedigree(rng,founders=4,generations=5):
+    """
+    Returns lines (ID FATHER MOTHER SEX) of a random pedigree and the
+    ids of its genotyped members. Children of one generation marry each
+    other (making loops, but never siblings) or married-ins, and some
+    remarry. A few children are recorded with only one of their parents.
+    """
+    indvs = {} # id -> [father, mother, sex]
+    def new_indv(father,mother,sex):
+        id = "i" + str(len(indvs) + 1)
+        indvs[id] = [father,mother,sex]
+        return id
+
+    generation = []
+    for i in range(founders):
+        father = new_indv("0","0",1)
+        mother = new_indv("0","0",2)
+        for j in range(rng.randint(1,3)):
+            generation.append(new_indv(father,mother,rng.randint(1,2)))
+
+    for i in range(generations):
+        rng.shuffle(generation)
+        males = [id for id in generation if indvs[id][2] == 1]
+        females = [id for id in generation if indvs[id][2] == 2]
+        couples = []
+        for male in males:
+            female = None
+            if len(females) != 0 and rng.random() < 0.5:
+                female = females.pop()
+                #siblings marry married-ins instead
+                if indvs[female][0] == indvs[male][0] and indvs[male][0] != "0":
+                    female = None
+            if female == None:
+                female = new_indv("0","0",2)
+            couples.append((male,female))
+            if rng.random() < 0.15: #remarriage
+                couples.append((male,new_indv("0","0",2)))
+        for female in females:
+            if rng.random() < 0.5:
+                couples.append((new_indv("0","0",1),female))
+
+        next_generation = []
+        for father,mother in couples:
+            for j in range(rng.randint(0,3)):
+                if rng.random() < 0.05: #only one parent recorded
+                    if rng.random() < 0.5:
+                        next_generation.append(new_indv(father,"0",rng.randint(1,2)))
+                    else:
+                        next_generation.append(new_indv("0",mother,rng.randint(1,2)))
+                    continue
+                next_generation.append(new_indv(father,mother,rng.randint(1,2)))
+        if len(next_generation) == 0:
+            break
+        generation = next_generation
+
+    #married-ins without children are left out of the pedigree
+    parents = set()
+    for father,mother,sex in indvs.values():
+        parents.add(father)
+        parents.add(mother)
+    lines = ["ID FATHER MOTHER SEX"]
+    genotyped = []
+    for id,(father,mother,sex) in indvs.items():
+        if father == "0" and mother == "0" and not id in parents:
+            continue
+        lines.append(id + " " + father + " " + mother + " " + str(sex))
+        if rng.random() < 0.45:
+            genotyped.append(id)
+    return lines,genotyped
+
+def load_pedigree(lines):
+    """Returns a PedigreeTree built from pedigree lines"""
+    struct_file = tempfile.NamedTemporaryFile("w",suffix=".txt",delete=False)
+    struct_file.write("\n".join(lines) + "\n")
+    struct_file.close()
+    try:
+        return PedigreeTree(struct_file.name)
+    finally:
+        os.remove(struct_file.name)
+
+def random_cohorts(rng,ped_tree,genotyped,count=30):
+    """
+    Returns lists of genotyped ids that could share an IBD segment:
+    mostly descendants of a random ancestor, sometimes any genotyped ids.
+    """
+    ancestors = [id for id in ped_tree.indvs if id != "0" and len(ped_tree.indvs[id].children) != 0]
+    genotyped_set = set(genotyped)
+    cohorts = []
+    while len(cohorts) < count and len(ancestors) != 0:
+        if rng.random() < 0.8:
+            candidates = sorted(ped_tree.descendants(rng.choice(ancestors)) & genotyped_set)
+        else:
+            candidates = sorted(genotyped_set)
+        if len(candidates) >= 2:
+            cohorts.append(rng.sample(candidates,rng.randint(2,min(5,len(candidates)))))
+    return cohorts
+
+#answers to compare
+
+def ancestor_answer(shared_ancestors):
+    """Sources found by find_collective_ca with their children and cohorts"""
+    answer = []
+    for id,node in shared_ancestors.items():
+        answer.append((id,sorted(child.indv.id for child in node.children), \
+            sorted(set(indv.id for indv in node.cohort))))
+    return sorted(answer)
+
+def subped_answer(subpeds):
+    """Sources and members of SubPedigrees"""
+    return sorted((subped.source,tuple(sorted(subped.mem_ids))) for subped in subpeds)
+
+#stage inputs
+
+def descendants_inputs(ped_tree,cohorts):
+    return [(ped_tree,id) for id in ped_tree.indvs if id != "0"]
+
+def is_descendant_inputs(ped_tree,cohorts):
+    """each individual with a random other individual (the possible ancestor)"""
+    ids = sorted(id for id in ped_tree.indvs if id != "0")
+    rng = random.Random(len(ids))
+    return [(ped_tree,id,rng.choice(ids)) for id in ids]
+
+def cohort_inputs(ped_tree,cohorts):
+    return [(ped_tree,cohort) for cohort in cohorts]
+
+def haplotype_inputs(ped_tree,cohorts):
+    """cohorts with random parental haplotypes for members with parents"""
+    inputs = []
+    for cohort in cohorts:
+        rng = random.Random(str(cohort))
+        haps = {}
+        for id in cohort:
+            if ped_tree.indvs[id].parents != None and rng.random() < 0.6:
+                haps[id] = rng.choice(["11","21"])
+        inputs.append((ped_tree,cohort,haps))
+    return inputs
+
+def min_pedigree_inputs(ped_tree,cohorts):
+    inputs = []
+    for cohort in cohorts:
+        inputs.append((ped_tree,cohort,None))
+        inputs.append((ped_tree,cohort,random.Random(str(cohort)).randint(2,40)))
+    return inputs
+
+def source_region_inputs(ped_tree,cohorts):
+    """cohorts with each of their sources and the part of the pedigree below it"""
+    inputs = []
+    for cohort in cohorts:
+        for source in sorted(ped_tree.find_collective_ca(cohort)):
+            inputs.append((ped_tree,cohort,source,ped_cohort.get_source_region(ped_tree,source)))
+    return inputs
+
+def chain_inputs(ped_tree,cohorts):
+    """min_pedigree_inputs with the pedigree's chains (see compress_chains)"""
+    genotyped = set()
+    for cohort in cohorts:
+        genotyped.update(cohort)
+    ped_tree.compress_chains(genotyped)
+    chains = (ped_tree.chain_tops,ped_tree.chain_spouses,ped_tree.chain_members)
+    ped_tree.chain_tops,ped_tree.chain_spouses,ped_tree.chain_members = {},set(),{}
+    return [input + (chains,) for input in min_pedigree_inputs(ped_tree,cohorts)]
+
+def moved_child_inputs(ped_tree,cohorts):
+    """
+    A few edited versions of the pedigree, each with one child moved to a
+    new couple (another man and woman of the pedigree, so one or both of
+    them remarries, or its father and a new married-in wife), with the
+    cohorts' SubPedigrees in the original pedigree
+    """
+    records = ped_cohort.struct_records(ped_tree)
+    found = [(cohort,ped_cohort.find_min_pedigree(ped_tree,cohort,None,True)) for cohort in cohorts]
+    rng = random.Random(len(records))
+    children = sorted(id for id,(p_id,m_id,sex) in records.items() if p_id != "0")
+    inputs = []
+    for child in rng.sample(children,min(6,len(children))):
+        p_id,m_id,sex = records[child]
+        #parents can't be the child or its descendants
+        below = ped_tree.descendants(child) | {child}
+        men = sorted(id for id,record in records.items() if record[2] == 1 and not id in below)
+        women = sorted(id for id,record in records.items() if record[2] == 2 and not id in below)
+        new_parents = (p_id,"new_wife")
+        if rng.random() < 0.8:
+            new_parents = (rng.choice(men),rng.choice(women))
+        lines = ["ID FATHER MOTHER SEX"]
+        if new_parents[1] == "new_wife":
+            lines.append("new_wife 0 0 2")
+        for id,(father,mother,indv_sex) in records.items():
+            if id == child:
+                father,mother = new_parents
+            lines.append(id + " " + father + " " + mother + " " + str(indv_sex))
+        inputs.append((load_pedigree(lines),records,found))
+    return inputs
+
+def join_inputs(ped_tree,cohorts):
+    """sources with their SubPedigrees and a few target sizes"""
+    options = {}
+    for cohort in cohorts:
+        for subped in ped_cohort.find_min_pedigree(ped_tree,cohort,None,True):
+            options.setdefault(subped.source,[]).append(subped)
+    inputs = []
+    for source in sorted(options):
+        subpeds,min_size,full_ped = ped_cohort.get_valid_subpeds(ped_tree,options[source],None)
+        targets = random.Random(source).sample(range(min_size,len(full_ped)+1), \
+            min(3,len(full_ped) + 1 - min_size))
+        for target in targets:
+            inputs.append((source,subpeds,target,len(full_ped)))
+    return inputs
+
+#reference implementations
+
+def descendants_reference(ped_tree,id):
+    return sorted(indv.id for indv in ped_tree.indvs[id].descendants())
+
+def is_descendant_reference(ped_tree,desc_id,anc_id):
+    return desc_id in descendants_reference(ped_tree,anc_id)
+
+def ancestors_reference(ped_tree,cohort):
+    return ancestor_answer(ped_tree.find_collective_ca(cohort,fast=False))
+
+def haplotypes_reference(ped_tree,cohort,haps):
+    return ancestor_answer(ped_tree.find_collective_ca(cohort,fast=False,haps=haps))
+
+def paths_reference(ped_tree,cohort):
+    answer = []
+    shared_ancestors = ped_tree.find_collective_ca(cohort,fast=False)
+    for ancestor_id in sorted(shared_ancestors):
+        ancestor = shared_ancestors[ancestor_id]
+        for id in cohort:
+            path_set = {}
+            paths = ped_tree.get_all_paths(ancestor,id,ancestor.indv.sex,path_set)
+            answer.append((ancestor_id,id,sorted(sorted((node.indv.id,hap) for node,hap in path) \
+                for path in (paths or []))))
+    return answer
+
+def min_pedigree_reference(ped_tree,cohort,max_complexity):
+    subpeds = ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,pairs=False,fast=False)
+    if max_complexity != None:
+        subpeds = [subped for subped in subpeds \
+            if ped_cohort.get_bit_complexity(ped_tree,subped.mem_ids) <= max_complexity]
+    return subped_answer(subpeds)
+
+def source_region_reference(ped_tree,cohort,source,region):
+    """the SubPedigrees of a source from a search for every source"""
+    subpeds = ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,pairs=False,fast=False)
+    return subped_answer([subped for subped in subpeds if subped.source == source])
+
+def chains_reference(ped_tree,cohort,max_complexity,chains):
+    return min_pedigree_reference(ped_tree,cohort,max_complexity)
+
+def update_reference(ped_tree,records,found):
+    """every cohort searched again in the edited pedigree"""
+    return [subped_answer(ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,fast=False)) \
+        for cohort,subpeds in found]
+
+def join_reference(source,subpeds,target,max_size):
+    low,high = ped_cohort.find_joined_ped(source,subpeds,target,max_size)
+    return sorted(set(low.mem_ids)),sorted(set(high.mem_ids))
+
+#alternative engines
+
+def descendants_index(ped_tree,id):
+    return sorted(ped_tree.descendants(id))
+
+def is_descendant_index(ped_tree,desc_id,anc_id):
+    return ped_tree.is_descendant(desc_id,anc_id)
+
+def ancestors_sweep(ped_tree,cohort):
+    return ancestor_answer(ped_tree.find_collective_ca_sweep(cohort))
+
+def haplotypes_sweep(ped_tree,cohort,haps):
+    return ancestor_answer(ped_tree.find_collective_ca_sweep(cohort,haps=haps))
+
+def paths_sweep(ped_tree,cohort):
+    """get_all_paths from the nodes found by find_collective_ca_sweep"""
+    answer = []
+    shared_ancestors = ped_tree.find_collective_ca_sweep(cohort)
+    for ancestor_id in sorted(shared_ancestors):
+        ancestor = shared_ancestors[ancestor_id]
+        for id in cohort:
+            path_set = {}
+            paths = ped_tree.get_all_paths(ancestor,id,ancestor.indv.sex,path_set)
+            answer.append((ancestor_id,id,sorted(sorted((node.indv.id,hap) for node,hap in path) \
+                for path in (paths or []))))
+    return answer
+
+def source_region_search(ped_tree,cohort,source,region):
+    """find_min_pedigree for one source, only searching the region below it"""
+    return subped_answer(ped_cohort.find_min_pedigree(ped_tree,cohort,source,True,region))
+
+def min_pedigree_sweep(ped_tree,cohort,max_complexity):
+    """min_pedigree_reference with sources found by find_collective_ca_sweep"""
+    subpeds = ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,pairs=False)
+    if max_complexity != None:
+        subpeds = [subped for subped in subpeds \
+            if ped_cohort.get_bit_complexity(ped_tree,subped.mem_ids) <= max_complexity]
+    return subped_answer(subpeds)
+
+def min_pedigree_pruned(ped_tree,cohort,max_complexity):
+    """find_min_pedigree abandoning sources over max_complexity during the search"""
+    return subped_answer(ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,None,max_complexity,pairs=False))
+
+def min_pedigree_pairs(ped_tree,cohort,max_complexity):
+    """find_min_pedigree with cohorts of two found by find_pair_pedigree"""
+    return subped_answer(ped_cohort.find_min_pedigree(ped_tree,cohort,None,True,None,max_complexity))
+
+def min_pedigree_chains(ped_tree,cohort,max_complexity,chains):
+    """find_min_pedigree searching through compressed chains"""
+    ped_tree.chain_tops,ped_tree.chain_spouses,ped_tree.chain_members = chains
+    try:
+        return min_pedigree_pruned(ped_tree,cohort,max_complexity)
+    finally:
+        ped_tree.chain_tops,ped_tree.chain_spouses,ped_tree.chain_members = {},set(),{}
+
+def join_lists(source,subpeds,target,max_size):
+    """find_joined_ped joining lists of member ids with list(set(a + b))"""
+    table = [[None] * max_size for subped in subpeds]
+    sys.setrecursionlimit(max(sys.getrecursionlimit(),max_size**2))
+    low,high = join_list_peds(table,[subped.mem_ids for subped in subpeds],target,[],0)
+    return sorted(low),sorted(high)
+
+def join_list_peds(table,mem_lists,target_size,current_ids,list_num):
+    """join_peds on lists of member ids"""
+    if table[list_num][len(current_ids)] != None:
+        return table[list_num][len(current_ids)]
+    new_ids = list(set(current_ids + mem_lists[list_num]))
+    if len(new_ids) == target_size:
+        table[list_num][len(current_ids)] = (new_ids,new_ids)
+        return new_ids,new_ids
+    elif list_num + 1 == len(mem_lists):
+        table[list_num][len(current_ids)] = (current_ids,new_ids)
+        return current_ids,new_ids
+    low_ids = current_ids
+    if len(new_ids) > target_size:
+        high_ids = new_ids
+    else:
+        low_ids = new_ids
+        recurse_low,high_ids = join_list_peds(table,mem_lists,target_size,new_ids,list_num+1)
+        if len(recurse_low) > len(low_ids):
+            low_ids = recurse_low
+    if len(low_ids) != target_size and len(high_ids) != target_size:
+        recurse_low,recurse_high = join_list_peds(table,mem_lists,target_size,current_ids,list_num+1)
+        if len(recurse_low) > len(low_ids):
+            low_ids = recurse_low
+        if len(recurse_high) >= target_size and len(recurse_high) < len(high_ids):
+            high_ids = recurse_high
+    if len(low_ids) == target_size:
+        high_ids = low_ids
+    elif len(high_ids) == target_size:
+        low_ids = high_ids
+    table[list_num][len(current_ids)] = (low_ids,high_ids)
+    return low_ids,high_ids
+
+def update_incremental(ped_tree,records,found):
+    """update_options, only searching cohorts in the changed region again"""
+    cache = {"struct": records, "source": None, "max_component_size": None, \
+        "haplotypes": False, "cohorts": found}
+    args = argparse.Namespace(source=None,max_component_size=None,haplotypes=False,quiet=True, \
+        processes=1,time_limit=None,cohort_time_limit=None)
+    new_found = []
+    for option in ped_cohort.update_options(ped_tree,None,cache,args,new_found):
+        pass
+    return [subped_answer(subpeds) for cohort,subpeds in new_found]
+
+INPUTS = {
+    "descendants": descendants_inputs,
+    "is_descendant": is_descendant_inputs,
+    "find_collective_ca": cohort_inputs,
+    "haplotypes": haplotype_inputs,
+    "get_all_paths": cohort_inputs,
+    "find_min_pedigree": min_pedigree_inputs,
+    "source_region": source_region_inputs,
+    "chains": chain_inputs,
+    "update_options": moved_child_inputs,
+    "join_peds": join_inputs,
+}
+
+# stage -> [(name, function)], the reference implementation first
+ENGINES = {
+    "descendants": [("reference",descendants_reference),("index",descendants_index)],
+    "is_descendant": [("reference",is_descendant_reference),("index",is_descendant_index)],
+    "find_collective_ca": [("reference",ancestors_reference),("sweep",ancestors_sweep)],
+    "haplotypes": [("reference",haplotypes_reference),("sweep",haplotypes_sweep)],
+    "get_all_paths": [("reference",paths_reference),("sweep",paths_sweep)],
+    "find_min_pedigree": [("reference",min_pedigree_reference),("sweep",min_pedigree_sweep), \
+        ("pruned",min_pedigree_pruned),("pairs",min_pedigree_pairs)],
+    "source_region": [("reference",source_region_reference),("region",source_region_search)],
+    "chains": [("reference",chains_reference),("compressed",min_pedigree_chains)],
+    "update_options": [("reference",update_reference),("incremental",update_incremental)],
+    "join_peds": [("reference",join_reference),("lists",join_lists)],
+}
+
+def run_stage(stage,inputs,times):
+    """
+    Runs every engine for a stage on each input, raising an
+    AssertionError if any answer differs from the reference.
+    Adds the time taken by each engine to times.
+    """
+    for input in inputs:
+        reference = None
+        for name,engine in ENGINES[stage]:
+            start = time.perf_counter()
+            answer = engine(*input)
+            times[(stage,name)] = times.get((stage,name),0) + time.perf_counter() - start
+            if reference == None:
+                reference = answer
+            elif answer != reference:
+                raise AssertionError(stage + " engine " + name + " differs from the reference for input " + \
+                    str(input[1:]) + ":\n" + str(answer) + "\n" + str(reference))
+
+def main():
+    parser = argparse.ArgumentParser(description="compare sub-pedigree search engines against the reference")
+    parser.add_argument("-n", "--pedigrees", type=int, default=20, \
+        help="number of random pedigrees")
+    parser.add_argument("--seed", type=int, default=0, \
+        help="seed of the first random pedigree")
+    parser.add_argument("--stage", choices=sorted(ENGINES), action="append", \
+        help="only run this stage (can be repeated)")
+    parser.add_argument("--founders", type=int, default=4, \
+        help="number of founding couples of each random pedigree")
+    parser.add_argument("--generations", type=int, default=5, \
+        help="number of generations below the founders' children")
+    args = parser.parse_args()
+    stages = args.stage or list(ENGINES)
+
+    sys.setrecursionlimit(100000)
+    times = {} # (stage, engine name) -> seconds
+    counts = {} # stage -> number of inputs
+    for seed in range(args.seed,args.seed + args.pedigrees):
+        rng = random.Random(seed)
+        lines,genotyped = random_pedigree(rng,args.founders,args.generations)
+        ped_tree = load_pedigree(lines)
+        cohorts = random_cohorts(rng,ped_tree,genotyped)
+        for stage in stages:
+            inputs = INPUTS[stage](ped_tree,cohorts)
+            counts[stage] = counts.get(stage,0) + len(inputs)
+            try:
+                run_stage(stage,inputs,times)
+            except AssertionError as e:
+                print("pedigree seed " + str(seed) + ": " + str(e))
+                sys.exit(1)
+
+    print("stage\t\t\tengine\t\tinputs\tseconds\tspeedup")
+    for stage in stages:
+        reference_time = times.get((stage,ENGINES[stage][0][0]),0)
+        for name,engine in ENGINES[stage]:
+            seconds = times.get((stage,name),0)
+            speedup = "-"
+            if seconds > 0:
+                speedup = "%.2fx" % (reference_time / seconds)
+            print(stage.ljust(24) + name.ljust(16) + str(counts.get(stage,0)) + "\t" + \
+                "%.3f" % seconds + "\t" + speedup)
+    print("all engines match the reference")
+
+if __name__ == "__main__":
+    main()
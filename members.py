@@ -0,0 +1,171 @@
+"""
+Compact sets of pedigree members for SubPedigrees. Individual ids are
+interned as numbers (the same for the life of the process). Like a
+roaring bitmap, a MemberSet holds its members either as a bitmap (an int
+with bit i set for number low + i), or as the bytes of a sorted array of
+unsigned 32-bit ints when its numbers are too spread out for a bitmap to
+be smaller. Joining, sizing and comparing SubPedigrees then works on the
+numbers instead of lists of id strings. MemberSets are pickled (and sent
+to worker processes) as their ids, since numbers differ between processes.
+"""
+
+# python imports
+import array
+import bisect
+import signal
+import threading
+
+_numbers = {} # id -> number
+_ids = [] # number -> id
+_lock = threading.Lock()
+ALARM = getattr(signal,"SIGALRM",None) if hasattr(signal,"pthread_sigmask") else None
+
+def number(id):
+    """Returns the interned number of an individual id"""
+    num = _numbers.get(id)
+    if num == None:
+        #an alarm stopping a search (see search_anytime) is held back until
+        #the id is in both _numbers and _ids (one already due goes off as
+        #it is blocked, before any change)
+        block = ALARM != None and callable(signal.getsignal(ALARM))
+        try:
+            if block:
+                signal.pthread_sigmask(signal.SIG_BLOCK,[ALARM])
+            with _lock:
+                num = _numbers.setdefault(id,len(_ids))
+                if num == len(_ids):
+                    _ids.append(id)
+        finally:
+            if block:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK,[ALARM])
+    return num
+
+#number of set bits (int.bit_count is new in python 3.10)
+count_bits = getattr(int,"bit_count",None) or (lambda bits: bin(bits).count("1"))
+
+class MemberSet:
+    """
+    An unchanging set of individual ids. Supports len, in, iteration (in
+    no particular order), union (|), union_size, equality and hashing.
+    ids() gives the members as a sorted list of ids.
+    """
+    __slots__ = ("low","data","size")
+
+    def __init__(self,ids=()):
+        self.store_numbers(sorted(set(number(id) for id in ids)))
+
+    def store(self,low,bits):
+        """
+        Keeps the members of a bitmap, as the bitmap or (if that
+        is smaller) as sorted numbers. The same members are always
+        kept the same way, so MemberSets can be compared directly.
+        """
+        self.low = low
+        self.size = count_bits(bits)
+        if bits.bit_length() <= 32 * self.size:
+            self.data = bits
+            return
+        numbers = array.array("I")
+        while bits != 0:
+            bit = bits & -bits
+            numbers.append(low + bit.bit_length() - 1)
+            bits ^= bit
+        self.data = numbers.tobytes()
+
+    def store_numbers(self,numbers):
+        """Keeps the members from their sorted numbers, the same way as store"""
+        if len(numbers) == 0:
+            self.store(0,0)
+        elif numbers[-1] - numbers[0] < 32 * len(numbers):
+            bits = 0
+            for num in numbers:
+                bits |= 1 << (num - numbers[0])
+            self.store(numbers[0],bits)
+        else:
+            self.low = numbers[0]
+            self.size = len(numbers)
+            self.data = array.array("I",numbers).tobytes()
+
+    def bitmap(self):
+        """Returns the lowest number and the bitmap of the members"""
+        if type(self.data) == int:
+            return self.low,self.data
+        bits = 0
+        for num in memoryview(self.data).cast("I"):
+            bits |= 1 << (num - self.low)
+        return self.low,bits
+
+    def union_bitmap(self,other):
+        """Returns the lowest number and the bitmap of the union with another MemberSet"""
+        low,bits = self.bitmap()
+        other_low,other_bits = other.bitmap()
+        if low <= other_low:
+            return low,bits | (other_bits << (other_low - low))
+        return other_low,other_bits | (bits << (low - other_low))
+
+    def numbers(self):
+        """Returns the sorted interned numbers of the members"""
+        if type(self.data) == bytes:
+            return memoryview(self.data).cast("I")
+        numbers = []
+        bits = self.data
+        while bits != 0:
+            bit = bits & -bits
+            numbers.append(self.low + bit.bit_length() - 1)
+            bits ^= bit
+        return numbers
+
+    def ids(self):
+        return sorted(_ids[num] for num in self.numbers())
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (_ids[num] for num in self.numbers())
+
+    def __contains__(self,id):
+        num = _numbers.get(id)
+        if num == None or num < self.low:
+            return False
+        if type(self.data) == int:
+            return (self.data >> (num - self.low)) & 1 == 1
+        values = memoryview(self.data).cast("I")
+        pos = bisect.bisect_left(values,num)
+        return pos < len(values) and values[pos] == num
+
+    def __or__(self,other):
+        if other.size == 0:
+            return self
+        if self.size == 0:
+            return other
+        members = MemberSet.__new__(MemberSet)
+        if type(self.data) == bytes and type(other.data) == bytes:
+            #two sparse sets are merged as sorted numbers
+            members.store_numbers(sorted(set(self.numbers()).union(other.numbers())))
+        else:
+            members.store(*self.union_bitmap(other))
+        return members
+
+    def union_size(self,other):
+        """Returns the size of the union with another MemberSet without making it"""
+        if other.size == 0 or self.size == 0:
+            return self.size + other.size
+        if type(self.data) == bytes and type(other.data) == bytes:
+            return len(set(self.numbers()).union(other.numbers()))
+        return count_bits(self.union_bitmap(other)[1])
+
+    def __eq__(self,other):
+        return isinstance(other,MemberSet) and self.low == other.low and self.data == other.data
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.low,self.data))
+
+    def __reduce__(self):
+        return (MemberSet,(self.ids(),))
+
+    def __repr__(self):
+        return "MemberSet(" + repr(self.ids()) + ")"
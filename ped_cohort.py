@@ -0,0 +1,2146 @@
+"""
+Finds minimum pedigrees from IBD cohorts to a source. Can be
+imported (see Cohort) or run through ped-cohort.py.
+Authors: Alton Wiggers
+Date: 7/23/21
+"""
+
+#python imports
+import argparse
+import sys
+import io
+import contextlib
+import pickle
+import json
+import hashlib
+import threading
+import http.server
+import concurrent.futures
+import multiprocessing
+import signal
+import time
+import os #used for testing
+
+#local imports
+import IBD
+import compressed
+import plink
+import results
+from members import MemberSet
+from PedigreeTree import PedigreeTree
+from AncestorNode import AncestorNode
+
+class Parser(argparse.ArgumentParser):
+    def error(self, message):
+        sys.stderr.write('\nerror: %s\n' % message)
+        self.print_help()
+        sys.exit(2)
+
+class SubPedigree:
+    def __init__(self,source,cohorts,mem_ids):
+        self.source = source
+        self.cohorts = cohorts
+        #members are kept as a MemberSet, mem_ids lists them for output
+        if not isinstance(mem_ids,MemberSet):
+            mem_ids = MemberSet(mem_ids)
+        self.members = mem_ids
+
+    @property
+    def mem_ids(self):
+        """sorted list of member ids"""
+        return self.members.ids()
+
+    def __setstate__(self,state):
+        #pickles saved before members were kept as a MemberSet
+        if "mem_ids" in state:
+            state["members"] = MemberSet(state.pop("mem_ids"))
+        self.__dict__.update(state)
+
+class SourceIndex:
+    """
+    A cheap index of sources and the IBD cohorts that support them. Can be
+    used in place of the source options dictionary: SubPedigrees for a
+    source are only found when that source is looked up, and are kept for
+    later lookups.
+    """
+    def __init__(self,ped_tree,IBDs,quiet,max_complexity=None,haplotypes=False):
+        self.ped_tree = ped_tree
+        self.quiet = quiet
+        self.max_complexity = max_complexity
+        self.cohorts = {} # source id -> list of cohorts sharing the source
+        self.haps = {} # source id -> resolved haplotypes of each cohort (if used)
+        self.min_sizes = {} # source id -> lower bound on smallest SubPedigree
+        self.max_mems = {} # source id -> ids bounding the union of SubPedigrees
+        self.options = {} # source id -> list of SubPedigrees (once found)
+
+        ibd_count = 1
+        for selected_ibd in IBDs:
+            if not quiet:
+                print("indexing IBD cohort " + str(ibd_count)+"/"+str(len(IBDs)), end='\r')
+            ibd_count += 1
+
+            start_ids = list(selected_ibd.get_indvs())
+            if ped_tree.family_of(start_ids) == None:
+                continue # spread over unrelated families
+            haps = None
+            if haplotypes:
+                haps = IBD.resolved_haps(selected_ibd,ped_tree)
+            shared_ancestors = ped_tree.find_collective_ca(start_ids,haps=haps)
+            for ancestor_id in shared_ancestors:
+                ancestor = shared_ancestors[ancestor_id]
+                source_ids = ancestor_id.split('&')
+
+                #every SubPedigree has at least the source and cohort
+                min_size = len(set(source_ids) | \
+                    {id for id in start_ids if id in ped_tree.indvs})
+
+                #path members are below the source in the ancestor tree
+                max_mems = set(source_ids)
+                visited = set()
+                stack = list(ancestor.children)
+                while len(stack) != 0:
+                    node = stack.pop()
+                    if node.indv.id in visited:
+                        continue
+                    visited.add(node.indv.id)
+                    max_mems.add(node.indv.id)
+                    max_mems.add(node.indv.p_id)
+                    max_mems.add(node.indv.m_id)
+                    max_mems.update(ped_tree.chain_members.get(node.indv.id,[]))
+                    stack += node.children
+                max_mems.discard("0")
+
+                if ancestor_id in self.cohorts:
+                    self.cohorts[ancestor_id].append(start_ids)
+                    self.haps[ancestor_id].append(haps)
+                    self.min_sizes[ancestor_id] = min(min_size,self.min_sizes[ancestor_id])
+                    self.max_mems[ancestor_id] |= max_mems
+                else:
+                    self.cohorts[ancestor_id] = [start_ids]
+                    self.haps[ancestor_id] = [haps]
+                    self.min_sizes[ancestor_id] = min_size
+                    self.max_mems[ancestor_id] = max_mems
+        if not quiet:
+            print("\033[K",end='\r')
+
+    def keys(self):
+        return self.cohorts.keys()
+
+    def __contains__(self,source):
+        return source in self.cohorts
+
+    def __getitem__(self,source):
+        """
+        Finds (or returns already found) SubPedigrees for a source
+        """
+        if not source in self.options:
+            source_region = get_source_region(self.ped_tree,source)
+            options = []
+            for cohort,haps in zip(self.cohorts[source],self.haps[source]):
+                options += find_min_pedigree(self.ped_tree,cohort,source,self.quiet,source_region,self.max_complexity,None,haps)
+            self.options[source] = remove_redundant_peds(options)
+        return self.options[source]
+
+class ResultIndex:
+    """
+    The source options saved in a result file (see results.py). Can be
+    used in place of the source options dictionary: only the file's header
+    is read when opened, SubPedigrees for a source are read from the file
+    when that source is looked up, and are kept for later lookups.
+    """
+    def __init__(self,result_file):
+        self.result_file = result_file
+        self.summaries = result_file.sources # source id -> ped_count, total_mems, min_mems
+        self.options = {} # source id -> list of SubPedigrees (once read)
+
+    def keys(self):
+        return self.summaries.keys()
+
+    def __contains__(self,source):
+        return source in self.summaries
+
+    def __getitem__(self,source):
+        """
+        Reads (or returns already read) SubPedigrees for a source
+        """
+        if not source in self.options:
+            self.options[source] = [SubPedigree(source,cohorts,mem_ids) \
+                for cohorts,mem_ids in self.result_file.source_subpeds(source)]
+        return self.options[source]
+
+class Cohort:
+    """
+    A loaded pedigree and the IBD cohorts assigned to it, for use from
+    python. Source options, valid SubPedigrees and joined pedigrees are
+    kept once found so repeated calls don't search again.
+    Options are those of the command line by name, e.g.
+        cohort = Cohort("ped.txt","germ.match",max_component_size=30)
+        low_option,high_option = cohort.join("h+g",20)
+    """
+    def __init__(self,struct_filename,germ_filename,args=None,**options):
+        if args == None:
+            #start from the command line defaults
+            if type(germ_filename) == str:
+                germ_filename = [germ_filename]
+            args = parse_args("pedigree args",[struct_filename] + germ_filename)
+            args.quiet = True
+        for option,value in options.items():
+            if not hasattr(args,option):
+                raise TypeError("unknown option " + option)
+            setattr(args,option,value)
+        if "source" in options:
+            args.sources = None # found again from the new source
+        def error(message):
+            raise ValueError(message)
+        check_args(args,error)
+        self.args = args
+
+        # construct pedigree data structure
+        self.ped_tree = PedigreeTree(struct_filename)
+
+        # construct IBDs data structures (type: list) and assign them to
+        # individuals in pedigree (read one chromosome at a time later if
+        # processing by chromosome)
+        self.IBDs = None
+        if args.by_chromosome == None:
+            self.IBDs = IBD.get_IBDs(germ_filename, [], args.merge_gap)
+            IBD.ibd_to_indvs(self.IBDs, self.ped_tree)
+            # search through single-line lineages of ungenotyped
+            # individuals in one step (needs to know who is genotyped)
+            self.ped_tree.compress_chains()
+
+        self._source_options = None
+        self._valid = {} # source id -> (subpeds,min_size,full_ped)
+        self._joins = {} # (source id, size) -> (low_option,high_option)
+        self.lock = threading.Lock()
+
+    def source_options(self):
+        """
+        Returns a dictionary of source ids and their SubPedigrees
+        (see get_source_options)
+        """
+        with self.lock:
+            if self._source_options == None:
+                self._source_options = get_source_options(self.ped_tree,self.IBDs,self.args)
+            return self._source_options
+
+    def valid_subpeds(self,source):
+        """
+        Returns the SubPedigrees for a source within the maximum
+        bit complexity. Raises a ValueError if there are none.
+        """
+        return self._get_valid(source)[0]
+
+    def size_range(self,source):
+        """
+        Returns the minimum and maximum sizes of a
+        joined pedigree for a source.
+        """
+        subpeds,min_size,full_ped = self._get_valid(source)
+        return min_size,len(full_ped)
+
+    def _get_valid(self,source):
+        source = source.replace('+','&')
+        source_options = self.source_options()
+        if not source in source_options.keys():
+            raise ValueError("could not find source " + source)
+        with self.lock:
+            if source in self._valid:
+                return self._valid[source]
+        valid = get_valid_subpeds(self.ped_tree,source_options[source],self.args.max_component_size)
+        if len(valid[0]) == 0:
+            raise ValueError("no sub-pedigrees for " + source + " are within the maximum complexity")
+        with self.lock:
+            return self._valid.setdefault(source,valid)
+
+    def sources(self):
+        """
+        Returns a summary of each source with some valid SubPedigree
+        (approximate for sources not yet searched in lazy mode)
+        """
+        source_options = self.source_options()
+        summary = []
+        for source in sorted(source_options.keys()):
+            if isinstance(source_options,SourceIndex) and not source in self._valid:
+                summary.append({"source": source, \
+                    "cohorts": len(source_options.cohorts[source]), \
+                    "min_mems": source_options.min_sizes[source], \
+                    "max_mems": len(source_options.max_mems[source])})
+                continue
+            if isinstance(source_options,ResultIndex) and not source in self._valid \
+                and self.args.max_component_size == None:
+                #saved counts are exact without a maximum complexity
+                summary.append({"source": source, \
+                    "ped_count": source_options.summaries[source]["ped_count"], \
+                    "total_mems": source_options.summaries[source]["total_mems"]})
+                continue
+            try:
+                subpeds,min_size,full_ped = self._get_valid(source)
+            except ValueError:
+                continue
+            summary.append({"source": source, "ped_count": len(subpeds), \
+                "total_mems": len(full_ped)})
+        return summary
+
+    def join(self,source,size):
+        """
+        Joins SubPedigrees for a source to get a pedigree of the target
+        size. Returns the closest joined SubPedigrees below and above
+        the target size (the same SubPedigree if matched exactly).
+        """
+        source = source.replace('+','&')
+        subpeds,min_size,full_ped = self._get_valid(source)
+        if size < min_size or size > len(full_ped):
+            raise ValueError("size must be in the range " + str(min_size) + " to " + str(len(full_ped)))
+        with self.lock:
+            if (source,size) in self._joins:
+                return self._joins[(source,size)]
+        join = find_joined_ped(source,subpeds,size,len(full_ped))
+        with self.lock:
+            return self._joins.setdefault((source,size),join)
+
+    def write_struct(self,filename,ped):
+        """
+        Writes the structure of a SubPedigree to a text file
+        """
+        write_to_file(filename,self.ped_tree,list(set(ped.mem_ids)),self.args.quiet)
+
+    def write_ped(self,input,output,ped):
+        """
+        Copies the members of a SubPedigree from a .ped or .bed file
+        (to .bed/.bim/.fam files if the bed option is set or the input
+        is a .bed file). Returns the output (.ped or .bed) file name.
+        """
+        if self.args.bed or plink.is_bed(input):
+            return create_bed_file(input,output,list(set(ped.mem_ids)),self.ped_tree,self.args.quiet)
+        return create_ped_file(input,output,list(set(ped.mem_ids)),self.args.quiet,self.args.bgzip)
+
+    def write_components(self,prefix,ped,input_ped=None):
+        """
+        Writes files for each component of a joined SubPedigree
+        (see create_component_files). Returns the number of components.
+        """
+        args = argparse.Namespace(**vars(self.args))
+        args.component_filename = prefix
+        args.pedigree_filenames = None
+        if input_ped != None:
+            args.pedigree_filenames = [input_ped,None]
+        return create_component_files(self.ped_tree,args,ped,self.valid_subpeds(ped.source))
+
+def parse_args(description,argv=None): #argument parsing
+
+    parser = Parser()
+    parser.add_argument("struct_filename", \
+        help="input .txt file with pedigree structure")
+    parser.add_argument("germ_filename", nargs="+", \
+        help="input GERMLINE .match file(s)")
+    parser.add_argument("-o", "--output_filename", \
+        help="name for output file.")
+    parser.add_argument("-p", "--pedigree_filenames", nargs=2, \
+        help="input and output file names for an associated .ped (or PLINK .bed) file (2 arg format: -p [input_ped] [output_ped]")
+    parser.add_argument("-c", "--component_filename", \
+        help="a prefix for .ped files for all components that made up the final pedigree will output [component_filename]_i.ped for i components.")
+    parser.add_argument("-z", "--bgzip", action="store_true", \
+        help="bgzip compress output .ped files (adding .gz to their names)")
+    parser.add_argument("-b", "--bed", action="store_true", \
+        help="write PLINK binary .bed/.bim/.fam files instead of .ped files for -p and -c")
+    parser.add_argument("-s", "--source", action="append", \
+        help="a specific source to choose (repeat -s or separate sources with commas for several). Please use + instead of & for couples.")
+    parser.add_argument("-t", "--target_sizes", action="append", \
+        help="a pedigree size to join each chosen source to instead of prompting (repeat -t or separate sizes with commas for several)")
+    parser.add_argument("--merge_gap", type=int, metavar="BP", \
+        help="merge IBD segments of the same pair of haplotypes that overlap or are at most this many base pairs apart before forming cohorts")
+    parser.add_argument("-m", "--max_component_size", type=int, \
+        help="the maximum bit complexity for sub-pedigrees to consider when joining sub-pedigrees to reach a target size")
+    parser.add_argument("--haplotypes", action="store_true", \
+        help="only search the father's (or mother's) ancestors of cohort members whose IBD was resolved to their paternal (or maternal) haplotype")
+    parser.add_argument("-pikl", "--pickle_filename", \
+        help="a pickle file for saving found subpeds")
+    parser.add_argument("-r", "--results_filename", \
+        help="a result file for saving found subpeds, read one source at a time when loaded (replaces -pikl)")
+    parser.add_argument("-j", "--jsonl_filename", \
+        help="a JSON lines file that each new sub-pedigree is written to as soon as it is found")
+    parser.add_argument("--by_chromosome", metavar="SPILL_DIR", \
+        help="find sub-pedigrees one chromosome at a time, storing partial results in this directory")
+    parser.add_argument("-l", "--lazy", action="store_true", \
+        help="only index sources for the source menu and find sub-pedigrees for the selected source")
+    parser.add_argument("--serve", type=int, metavar="PORT", \
+        help="load everything once and answer JSON queries on localhost at this port instead of prompting")
+    parser.add_argument("--workers", type=int, default=4, \
+        help="number of threads answering queries with --serve, or of processes joining pedigrees for several sources")
+    parser.add_argument("--processes", type=int, default=1, \
+        help="number of processes finding sub-pedigrees for separate families in parallel")
+    parser.add_argument("--time_limit", type=float, metavar="SECONDS", \
+        help="stop searching for sub-pedigrees after this many seconds, searching the cheapest cohorts first and skipping the rest")
+    parser.add_argument("--cohort_time_limit", type=float, metavar="SECONDS", \
+        help="skip any cohort whose search takes longer than this many seconds")
+    parser.add_argument("--shard", metavar="I/N", \
+        help="only search the I-th of N shards of the IBD cohorts (1 to N) and save them in the -r result file, to be combined with the merge command")
+    parser.add_argument("-q", "--quiet", action="store_true", \
+        help="supress terminal output")
+
+    args = parser.parse_args(argv)
+    check_args(args,parser.error)
+    return args
+
+def check_args(args,error):
+    """
+    Checks options that depend on each other and converts them to the form
+    the search uses (--shard I/N to (I, N), -s to a list of sources and a
+    single source, comma-separated -s and -t values to lists). Used on the parsed command line and on the options a
+    Cohort is given by name, so checking twice changes nothing. Calls
+    error(message) for invalid options.
+    """
+    if type(args.shard) == str:
+        words = args.shard.split("/")
+        if len(words) != 2 or not words[0].isdigit() or not words[1].isdigit():
+            error("--shard must be I/N with 1 <= I <= N")
+        args.shard = (int(words[0]),int(words[1]))
+    if args.shard != None:
+        if not 1 <= args.shard[0] <= args.shard[1]:
+            error("--shard must be I/N with 1 <= I <= N")
+        if args.results_filename == None:
+            error("--shard needs a result file (-r) to save the shard in")
+        if args.by_chromosome != None:
+            error("--shard can't be used with --by_chromosome")
+
+    if args.haplotypes and args.by_chromosome != None:
+        error("--haplotypes can't be used with --by_chromosome")
+
+    #a lazy search only finds the sub-pedigrees of the chosen sources
+    if args.jsonl_filename != None and args.lazy:
+        error("-j can't be used with -l")
+
+    if args.merge_gap != None and args.merge_gap < 0:
+        error("--merge_gap can't be negative")
+
+    for limit,option in [(args.time_limit,"--time_limit"),(args.cohort_time_limit,"--cohort_time_limit")]:
+        if limit != None and not limit > 0:
+            error(option + " must be more than 0 seconds")
+
+    if args.time_limit != None or args.cohort_time_limit != None:
+        if args.by_chromosome != None or args.lazy or args.processes > 1:
+            error("--time_limit and --cohort_time_limit can't be used with --by_chromosome, -l or --processes")
+
+    #-s and -t can be repeated and take comma-separated values
+    if type(args.target_sizes) in [int,str]:
+        args.target_sizes = [args.target_sizes]
+    if args.target_sizes != None:
+        sizes = []
+        for size in args.target_sizes:
+            for word in str(size).split(","):
+                if not word.strip().isdigit():
+                    error("-t sizes must be whole numbers")
+                sizes.append(int(word))
+        args.target_sizes = sizes
+
+    #a single source also limits the search to the pedigree below it
+    if type(args.source) == str:
+        args.source = [args.source]
+    if type(args.source) == list:
+        args.sources = [source for value in args.source for source in value.split(",") if source != ""]
+        args.source = None
+        if len(args.sources) == 1:
+            args.source = args.sources[0]
+    elif not hasattr(args,"sources"):
+        args.sources = None
+
+
+def parse_merge_args(argv=None):
+    parser = Parser(prog="ped-cohort.py merge", \
+        description="combine the result files of every shard (see --shard) into one result file")
+    parser.add_argument("results_filename", \
+        help="the combined result file to write, then used with -r to select sources")
+    parser.add_argument("shard_filenames", nargs="+", \
+        help="result files saved by each shard")
+    parser.add_argument("-q", "--quiet", action="store_true", \
+        help="supress terminal output")
+    return parser.parse_args(argv)
+
+def main():
+
+    #combine shards instead of searching
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        args = parse_merge_args(sys.argv[2:])
+        merge_shards(args.results_filename,args.shard_filenames,args.quiet)
+        return
+
+    #parse arguments
+    args = parse_args("pedigree args")
+
+    #load the pedigree and IBDs
+    cohort = Cohort(args.struct_filename,args.germ_filename,args)
+
+    #only search and save one shard of the cohorts
+    if args.shard != None:
+        cohort.source_options()
+        if not args.quiet:
+            print("shard " + str(args.shard[0]) + "/" + str(args.shard[1]) + \
+                " stored in " + args.results_filename)
+        return
+
+    #find sources once, in the main thread, then answer queries
+    #until interrupted instead of prompting
+    if args.serve != None:
+        cohort.source_options()
+        serve(cohort,args)
+        return
+
+    #let user select one or more sources
+    sources = select_sources(cohort,args)
+
+    #join and write pedigrees for each source and size in a pool of workers
+    if len(sources) > 1 or args.target_sizes != None:
+        join_selections(cohort,args,get_size_selections(cohort,args,sources))
+        return
+
+    #let user select a desired pedigree size
+    chosen_ped = get_user_selection(cohort,args,sources[0])
+
+    #create output file
+    if args.output_filename != None:
+        cohort.write_struct(args.output_filename,chosen_ped)
+
+    #create ped file
+    if args.pedigree_filenames != None:
+        cohort.write_ped(args.pedigree_filenames[0],args.pedigree_filenames[1],chosen_ped)
+
+
+def write_to_file(filename,ped_tree,output_list,quiet):
+    """
+    writes ped struct to output file
+    """
+    out_file = open(filename, "w")
+    out_file.write("ID FATHER MOTHER SEX")
+    for id in output_list:
+        indv = ped_tree.indvs[id]
+        #changes parents to 0 if they are not in the pedigree
+        p = '0'
+        m = '0'
+        if indv.p_id in output_list and indv.m_id in output_list:
+            p = indv.p_id
+            m = indv.m_id
+        out_file.write("\n" + id + " " \
+            + p + " " \
+            + m + " "  \
+            + str(indv.sex))
+    out_file.close()
+    if not quiet:
+        print("pedigree structure stored in " + filename)
+
+def create_ped_file(input,output,ids,quiet,compress=False):
+    """
+    copies only the minimum pedigree members
+    from the input .ped file (plain or compressed)
+    to the output .ped file (bgzip compressed if
+    compress is True). Returns the output file name.
+    """
+    in_file = compressed.open_input(input)
+    lines = []
+
+    #find relevant individuals in input file
+    for line in in_file:
+        if line.strip():
+            words = line.split()
+            if words[1] in ids:
+                lines.append(line)
+    in_file.close()
+
+    #write relevant individuals to output file
+    output = ped_output_name(output,compress)
+    out_file = compressed.open_output(output,compress)
+    for line in lines:
+        out_file.write(line)
+    out_file.close()
+
+    if not quiet:
+        print("pedigree contents stored in " + output)
+    return output
+
+def create_bed_file(input,output,ids,ped_tree,quiet):
+    """
+    copies the minimum pedigree members from the input
+    .ped file (plain or compressed) or .bed file to PLINK
+    binary .bed/.bim/.fam files named after the output file.
+    Members missing from the input get missing genotypes.
+    Returns the .bed file name.
+    """
+    genotypes,bim = read_genotypes(input,ids)
+
+    output = write_bed_members(plink.output_prefix(output),ped_tree,ids,genotypes,bim)
+    if not quiet:
+        print("pedigree contents stored in " + output)
+    return output
+
+def read_genotypes(input,ids):
+    """
+    reads the genotypes of pedigree members from a .ped file
+    (plain or compressed) or a memory-mapped .bed file.
+    Returns a dictionary of ids to (phenotype, column of .bed
+    codes) and the .bim lines for the columns.
+    """
+    if plink.is_bed(input):
+        bed_file = plink.BedFile(input)
+        genotypes = {}
+        for id in set(ids):
+            if id in bed_file.fam:
+                genotypes[id] = (bed_file.fam[id][1],bed_file.column(id))
+        bed_file.close()
+        return genotypes,bed_file.bim
+
+    in_file = compressed.open_input(input)
+    id_set = set(ids)
+    rows = {}
+    markers = None
+
+    #find relevant individuals in input file
+    for line in in_file:
+        if line.strip():
+            words = line.split()
+            if markers == None:
+                markers = (len(words) - 6) // 2
+            if words[1] in id_set:
+                rows[words[1]] = words
+    in_file.close()
+
+    alleles = plink.ped_alleles(rows.values(),markers)
+    genotypes = {}
+    tables = []
+    for id in rows:
+        genotypes[id] = (rows[id][5],plink.ped_column(rows[id],alleles,tables))
+    bim = plink.bim_lines(plink.map_filename(input),alleles)
+    return genotypes,bim
+
+def write_bed_members(prefix,ped_tree,ids,genotypes,bim):
+    """
+    writes .bed/.bim/.fam files for pedigree members, with .fam
+    parents and sex from the pedigree structure. genotypes maps
+    ids to (phenotype, column of .bed codes).
+    Returns the .bed file name.
+    """
+    id_set = set(ids)
+    fam = []
+    columns = []
+    for id in ids:
+        indv = ped_tree.indvs[id]
+        #only put parents for an individual if they are also in the pedigree
+        dad = "0"
+        mom = "0"
+        if indv.p_id in id_set and indv.m_id in id_set:
+            dad = indv.p_id
+            mom = indv.m_id
+        phenotype = "-9"
+        if id in genotypes:
+            phenotype,column = genotypes[id]
+        else: #write missing genotypes if haplotypes are unknown
+            column = plink.missing_column(len(bim))
+        fam.append("1 " + id + " " + dad + " " + mom + " " + str(indv.sex) + " " + phenotype)
+        columns.append(column)
+    return plink.write_bed(prefix,fam,bim,columns)
+
+def ped_output_name(filename,compress):
+    """
+    Returns the name to write an output .ped file to
+    (with .gz added if compressed)
+    """
+    if compress and not filename.endswith(".gz"):
+        return filename + ".gz"
+    return filename
+
+
+def get_source_region(ped_tree,source):
+    """
+    Takes a pedigree (pedigreeTree) and a source id (individual or couple).
+    Returns a set of ids that every cohort member must be in for the
+    source to be shared by the cohort, and a set of ids that the ancestor
+    search can be bounded to (the source, any spouses and all of their
+    descendants).
+    """
+    cohort_region = None
+    search_region = set()
+    for id in source.replace("+","&").split("&"):
+        if id == "0" or not id in ped_tree.indvs:
+            return set(),set()
+        indv = ped_tree.indvs[id]
+
+        #cohort members must descend from every member of the source
+        below = ped_tree.descendants(id)
+        below.add(id)
+        if cohort_region == None:
+            cohort_region = below
+        else:
+            cohort_region = cohort_region & below
+
+        #spouses decide whether the source is combined into a couple
+        search_region |= below
+        for couple in indv.couples:
+            for spouse in [couple.p,couple.m]:
+                search_region.add(spouse.id)
+                search_region |= ped_tree.descendants(spouse.id)
+
+    return cohort_region,search_region
+
+def find_min_pedigree(ped_tree,start_ids,source,quiet,source_region=None,max_complexity=None,pruned=None,haps=None,pairs=True,fast=True):
+    """
+    Takes a pedigree (pedigreeTree) and a list of ids (strings).
+    Will find all shared sources for the starting indvs and get a SubPedigree
+    of minimum members to cover all paths from the source to the indvs.
+    If a source_region (from get_source_region) is given, cohorts outside
+    of it are rejected and the ancestor search is bounded to it.
+    If a max_complexity is given, sources are abandoned as soon as their
+    SubPedigree is sure to be over it, and their ids added to pruned (list).
+    If haps (see IBD.resolved_haps) is given, only the parent each of those
+    indvs inherited the IBD from is searched for sources.
+    If pairs, cohorts of two indvs are found by find_pair_pedigree.
+    fast is passed on to find_collective_ca.
+    Returns a list of all found SubPedigrees.
+    """
+    #print("starting ids: " + str(start_ids))
+
+    ped_options = []
+
+    #cohorts spread over unrelated families have no shared ancestors
+    if ped_tree.family_of(start_ids) == None:
+        return ped_options
+
+    #most cohorts are pairs, which don't need an ancestor tree
+    if pairs and source_region == None and not haps and len(start_ids) == 2 \
+        and start_ids[0] != start_ids[1] \
+        and start_ids[0] in ped_tree.indvs and start_ids[1] in ped_tree.indvs:
+        return find_pair_pedigree(ped_tree,start_ids,source,max_complexity,pruned)
+
+    if source_region != None:
+        cohort_region,search_region = source_region
+        #reject cohorts that can't all descend from the source
+        for id in start_ids:
+            if id in ped_tree.indvs and not id in cohort_region:
+                return ped_options
+        #find shared ancestors below the source only
+        shared_ancestors = ped_tree.find_collective_ca(start_ids,bound=search_region,fast=fast,haps=haps)
+    else:
+        #find shared ancestors
+        shared_ancestors = ped_tree.find_collective_ca(start_ids,fast=fast,haps=haps)
+
+    if source != None:
+        source = source.replace("+","&")
+
+    #create a list for each ancestor
+    anc_count = 1
+    for ancestor_id in shared_ancestors:
+
+        if source != None and ancestor_id != source:
+            continue
+
+        if not quiet:
+            print("finding set for ancestor " + str(anc_count)+"/"+str(len(shared_ancestors)), end='\r')
+
+        #find all paths from ancestor to descendents
+        ancestor = shared_ancestors[ancestor_id]
+
+        bound = None
+        if max_complexity != None:
+            bound = ComplexityBound(ped_tree)
+            for id in ancestor_id.split('&'):
+                bound.add(id)
+
+        all_paths = set() #set of ancestorNodes
+        #get all paths from each start ids to source
+        for id in start_ids:
+            path_set = {}
+            ped_tree.get_all_paths(ancestor,id,ancestor.indv.sex,path_set)
+            if bound != None:
+                #add the members (and their parents) new to these paths
+                for node in path_set.keys() - all_paths:
+                    for mem_id in node.indv.id.split('&'):
+                        bound.add(mem_id)
+                    indv = ped_tree.indvs[mem_id]
+                    if node.indv.id != ancestor_id and indv.p != None and indv.m != None:
+                        bound.add(indv.m_id)
+                        bound.add(indv.p_id)
+                    for chain_id in ped_tree.chain_members.get(node.indv.id,[]):
+                        bound.add(chain_id)
+            all_paths = all_paths | path_set.keys()
+            if bound != None and bound.complexity > max_complexity:
+                break
+
+        #abandon sources whose SubPedigree would be too complex
+        if bound != None and bound.complexity > max_complexity:
+            if pruned != None:
+                pruned.append(ancestor_id)
+            anc_count += 1
+            continue
+
+        contains_loops = False
+
+        min_ids = []
+        parent_ids = []
+        for node in all_paths:
+            ids = node.indv.id.split('&')
+            for id in ids:
+                min_ids.append(id)
+            #add back the rest of a compressed chain
+            min_ids += ped_tree.chain_members.get(node.indv.id,[])
+            indv = ped_tree.indvs[id]
+            #add parents
+            if node.indv.id != ancestor_id and indv.p != None and indv.m != None:
+                parent_ids.append(indv.m_id)
+                parent_ids.append(indv.p_id)
+        parent_ids = list(set(parent_ids))
+
+        married_in_count = 0
+        for id in parent_ids:
+            if not id in min_ids:
+                married_in_count += 1
+        
+        for id in min_ids: #identify loops in the pedigree
+            indv = ped_tree.indvs[id]
+            if indv.p != None and indv.m != None \
+                and indv.p_id + "&" + indv.m_id != ancestor_id \
+                and indv.p_id in min_ids and indv.m_id in min_ids:
+                contains_loops = True
+                break
+        #sort ids for later comparisons
+        min_ids = sorted(list(set(min_ids + parent_ids)))
+
+        subped = SubPedigree(ancestor_id,[start_ids],min_ids)
+
+        ped_options.append(subped)
+
+        anc_count += 1
+    
+    if not quiet:
+        print("\033[K",end='\r')
+    return ped_options
+
+def find_pair_pedigree(ped_tree,start_ids,source,max_complexity=None,pruned=None):
+    """
+    Finds the same SubPedigrees as find_min_pedigree for a cohort of two
+    individuals in the pedigree, from their sets of ancestors instead of an
+    ancestor tree. A shared ancestor is a source if it is one of the pair or
+    has two or more children that are ancestors of the pair (otherwise all
+    of its paths go through one child). Couples are combined as in
+    PedigreeTree.combine_couples. A source's SubPedigree holds the source,
+    everything below it that is an ancestor of the pair, and their parents.
+    Sources over max_complexity are added to pruned (list).
+    """
+    ped_options = []
+    first = ped_tree.ancestors(start_ids[0])
+    second = ped_tree.ancestors(start_ids[1])
+    tree = first | second #the pair and their ancestors
+
+    sources = []
+    for id in first & second:
+        indv = ped_tree.indvs[id]
+        if id in start_ids or \
+            len([child for child in indv.children if child.id in tree]) > 1:
+            sources.append(id)
+    source_set = set(sources)
+
+    #combine couples (source id -> individual whose children are searched)
+    combined = {}
+    for id in sources:
+        indv = ped_tree.indvs[id]
+        if len(indv.couples) == 1:
+            couple = indv.couples[0]
+            if couple.id in combined:
+                continue
+            if couple.p.id in source_set and couple.m.id in source_set:
+                combined[couple.id] = indv
+                continue
+        combined[id] = indv
+
+    if source != None:
+        source = source.replace("+","&")
+
+    for ancestor_id,indv in combined.items():
+        if source != None and ancestor_id != source:
+            continue
+
+        #everything below the source on the way to the pair
+        if ancestor_id == indv.id:
+            stack = [indv]
+        else:
+            stack = [child for child in indv.children if child.id in tree]
+        path_ids = set()
+        for node in stack:
+            path_ids.add(node.id)
+        while len(stack) > 0:
+            node = stack.pop()
+            for child in node.children:
+                if child.id in tree and not child.id in path_ids:
+                    path_ids.add(child.id)
+                    stack.append(child)
+
+        min_ids = set(path_ids)
+        min_ids.update(ancestor_id.split('&'))
+        for id in path_ids:
+            if id != ancestor_id:
+                node = ped_tree.indvs[id]
+                min_ids.add(node.p_id)
+                min_ids.add(node.m_id)
+        min_ids = sorted(min_ids)
+
+        #abandon sources whose SubPedigree is too complex
+        if max_complexity != None and get_bit_complexity(ped_tree,min_ids) > max_complexity:
+            if pruned != None:
+                pruned.append(ancestor_id)
+            continue
+
+        ped_options.append(SubPedigree(ancestor_id,[start_ids],min_ids))
+
+    return ped_options
+
+class ComplexityBound:
+    """
+    Keeps the bit complexity (see get_bit_complexity) of a growing set of
+    pedigree members. Once the source is in the set, adding members on
+    paths below it (with their parents) can never lower the complexity,
+    so it is a lower bound for the finished SubPedigree.
+    NOTE: get_bit_complexity's checks never count ungenotyped founding
+    couples, so g is always 0 here as well.
+    """
+    def __init__(self,ped_tree):
+        self.ped_tree = ped_tree
+        self.mem_ids = set()
+        self.complexity = 0 # 2n-f of the members so far
+
+    def add(self,id):
+        if id in self.mem_ids:
+            return
+        self.mem_ids.add(id)
+        indv = self.ped_tree.indvs[id]
+        if indv.p_id in self.mem_ids and indv.m_id in self.mem_ids:
+            self.complexity += 2 # non-founder
+        else:
+            self.complexity -= 1 # founder
+        #children in the set may now have both parents (founder -> non-founder)
+        for child in indv.children:
+            if child.id in self.mem_ids and child.p_id in self.mem_ids \
+                and child.m_id in self.mem_ids:
+                self.complexity += 3
+
+def get_source_options(ped_tree,IBDs,args):
+    """
+    get a dictionary of sources and a list of SubPedigree
+    objects for each IBD cohort with the keyed source as
+    a possible source.
+    """
+
+    #only index sources for now, options are found once a source is chosen
+    if args.lazy and args.source == None and args.pickle_filename == None \
+        and args.results_filename == None and IBDs != None:
+        return SourceIndex(ped_tree,IBDs,args.quiet,args.max_component_size,args.haplotypes)
+
+    #only search the cohorts in this shard, keeping their positions
+    positions = None
+    if args.shard != None:
+        positions = []
+        for i,cohort in enumerate(generate_cohorts(IBDs)):
+            if in_shard(cohort,args.shard):
+                positions.append(i)
+        IBDs = [IBDs[i] for i in positions]
+
+    loaded = False
+    cache = None
+    #(cohort, SubPedigrees) for each cohort searched or reused, only kept
+    #in memory when they are saved
+    found = None
+    if args.pickle_filename != None or args.results_filename != None:
+        found = []
+    skipped = [] # (cohort number, cohort) for each cohort over the time limits
+    #check for result file, only reading the selected sources if nothing changed
+    result_file = None
+    if args.results_filename != None and os.path.exists(args.results_filename):
+        result_file = results.ResultFile(args.results_filename)
+        if not covers_search(result_file.search,args):
+            result_file.close()
+            result_file = None
+    pickled = None
+    if result_file == None and args.pickle_filename != None and os.path.exists(args.pickle_filename):
+        pickle_file = open(args.pickle_filename,"rb")
+        pickled = pickle.load(pickle_file)
+        pickle_file.close()
+        if type(pickled) == dict and not covers_search(pickled,args):
+            pickled = None
+
+    if result_file != None:
+        if result_file.struct() == struct_records(ped_tree) and (IBDs == None or \
+            result_file.search["cohorts"] == results.cohorts_digest(generate_cohorts(IBDs))):
+            #sub-pedigrees are written to -j in the order they were found
+            if args.jsonl_filename != None:
+                write_options((SubPedigree(source,cohorts,mem_ids) for cohort,subpeds in result_file.found() \
+                    for source,cohorts,mem_ids in subpeds),args)
+            return ResultIndex(result_file)
+        cache = {"struct": result_file.struct(), "source": result_file.search["source"], \
+            "max_component_size": result_file.search["max_component_size"], \
+            "haplotypes": result_file.search.get("haplotypes",False), "cohorts": []}
+        for cohort,subpeds in result_file.found():
+            cache["cohorts"].append((cohort,[SubPedigree(source,cohorts,mem_ids) \
+                for source,cohorts,mem_ids in subpeds]))
+        result_file.close()
+        options = update_options(ped_tree,IBDs,cache,args,found,skipped)
+    #check for pickle file
+    elif pickled != None:
+        options = pickled
+        loaded = True
+        if type(options) == dict: #saved with the pedigree structure
+            cache = options
+            options = update_options(ped_tree,IBDs,cache,args,found,skipped)
+    elif IBDs == None:
+        #get options one chromosome at a time
+        options = generate_options_by_chromosome(ped_tree,args,found)
+    else:
+        #get options from each IBD cohort as they are found
+        options = generate_options(ped_tree,generate_cohorts(IBDs),args,found,None,generate_haps(ped_tree,IBDs,args),skipped)
+
+    #assign options to the correct source, skipping redundant pedigrees
+    source_options = write_options(options,args)
+
+    #skipped cohorts are left out of saved files, so they are searched next time
+    if len(skipped) != 0:
+        if positions != None:
+            numbers = set(number for number,cohort in skipped)
+            positions = [positions[i] for i in range(len(positions)) if not i in numbers]
+        if not args.quiet:
+            print("skipped " + str(len(skipped)) + " cohorts over the time limit:")
+            for number,cohort in skipped:
+                print("  " + " ".join(cohort))
+            if args.results_filename != None or args.pickle_filename != None:
+                print("they are not saved, so running again with the same file only searches them")
+
+    #save again if the pedigree structure changed since the pickle was saved
+    if cache != None and (cache["struct"] != struct_records(ped_tree) \
+        or len(found) != len(cache["cohorts"])):
+        loaded = False
+        args = argparse.Namespace(**vars(args))
+        args.source = cache["source"]
+        args.max_component_size = cache["max_component_size"]
+        args.haplotypes = cache.get("haplotypes",False)
+
+    #save to result file (a loaded one is only searched again after a change)
+    if args.results_filename != None:
+        search = {"source": args.source, "max_component_size": args.max_component_size, \
+            "haplotypes": args.haplotypes}
+        if cache != None:
+            search = {"source": cache["source"], "max_component_size": cache["max_component_size"], \
+                "haplotypes": cache.get("haplotypes",False)}
+        search["cohorts"] = results.cohorts_digest([cohort for cohort,subpeds in found])
+        if args.shard != None:
+            search["shard"] = list(args.shard)
+        results.write_results(args.results_filename,source_options,found,struct_records(ped_tree),search,positions)
+
+    #save to pickle file
+    if args.pickle_filename != None and not loaded:
+        pickle_file = open(args.pickle_filename,"wb")
+        pickle.dump({"struct": struct_records(ped_tree), "source": args.source, \
+            "max_component_size": args.max_component_size, "haplotypes": args.haplotypes, \
+            "cohorts": found},pickle_file)
+        pickle_file.close()
+
+    return source_options
+
+def covers_search(search,args):
+    """
+    Returns whether SubPedigrees saved with the search options in search
+    (a dictionary with source, max_component_size and haplotypes) hold all
+    of those a search with args would find: saved without a source or with
+    the same one, without a maximum complexity or with one at least as high,
+    and with the same haplotypes option. Otherwise they are searched again.
+    """
+    if search["source"] != None and search["source"] != args.source:
+        reason = "source " + str(search["source"])
+    elif search["max_component_size"] != None and (args.max_component_size == None \
+        or args.max_component_size > search["max_component_size"]):
+        reason = "maximum complexity " + str(search["max_component_size"])
+    elif search.get("haplotypes",False) != args.haplotypes:
+        reason = "haplotypes option " + str(search.get("haplotypes",False))
+    else:
+        return True
+    if not args.quiet:
+        print("saved sub-pedigrees were found with " + reason + ", searching again")
+    return False
+
+def in_shard(cohort,shard):
+    """
+    Returns True if a cohort (list of ids) is in shard (I, N), the same
+    on every machine and for the same ids in any order
+    """
+    digest = hashlib.sha1(" ".join(sorted(cohort)).encode()).hexdigest()
+    return int(digest,16) % shard[1] == shard[0] - 1
+
+def merge_shards(filename,shard_filenames,quiet):
+    """
+    Combines the result files saved by every shard of a search (see
+    --shard) into one result file, with the same SubPedigrees in the
+    same order as searching all cohorts at once. Raises a ValueError
+    if the shards don't match or some are missing.
+    """
+    entries = [] # (position, cohort, SubPedigrees) of every cohort
+    search = None
+    struct = None
+    shards = set()
+    for shard_filename in shard_filenames:
+        result_file = results.ResultFile(shard_filename)
+        shard_search = dict(result_file.search)
+        if not "shard" in shard_search or result_file.positions() == None:
+            raise ValueError(shard_filename + " was not saved by a shard")
+        shard = tuple(shard_search.pop("shard"))
+        del shard_search["cohorts"]
+        if search == None:
+            search = shard_search
+            struct = result_file.struct()
+            shard_count = shard[1]
+        elif shard_search != search or shard[1] != shard_count or result_file.struct() != struct:
+            raise ValueError(shard_filename + " was saved with different options or pedigree structure")
+        if shard in shards:
+            raise ValueError("shard " + str(shard[0]) + "/" + str(shard[1]) + " was given more than once")
+        shards.add(shard)
+
+        for position,(cohort,subpeds) in zip(result_file.positions(),result_file.found()):
+            entries.append((position,cohort,[SubPedigree(source,cohorts,mem_ids) \
+                for source,cohorts,mem_ids in subpeds]))
+        result_file.close()
+        if not quiet:
+            print("read shard " + str(shard[0]) + "/" + str(shard[1]) + " from " + shard_filename)
+
+    missing = [str(i) for i in range(1,shard_count + 1) if not (i,shard_count) in shards]
+    if len(missing) != 0:
+        raise ValueError("missing shards " + ", ".join(missing) + " of " + str(shard_count))
+
+    #the cohorts' SubPedigrees in their original order, then grouped as usual
+    entries.sort(key=lambda entry: entry[0])
+    found = [(cohort,subpeds) for position,cohort,subpeds in entries]
+    options = [option for cohort,subpeds in found for option in subpeds]
+    source_options = group_options(options)
+
+    search["cohorts"] = results.cohorts_digest([cohort for cohort,subpeds in found])
+    results.write_results(filename,source_options,found,struct,search)
+    if not quiet:
+        print("merged " + str(len(found)) + " cohorts with sub-pedigrees for " + \
+            str(len(source_options)) + " sources into " + filename)
+
+def struct_records(ped_tree):
+    """
+    Returns a dictionary of each individual's id to
+    its (father id, mother id, sex) in the pedigree
+    """
+    records = {}
+    for id,indv in ped_tree.indvs.items():
+        if id != "0":
+            records[id] = (indv.p_id,indv.m_id,indv.sex)
+    return records
+
+def changed_region(old_records,ped_tree):
+    """
+    Compares the pedigree with the records (see struct_records) of an
+    earlier version of it. Returns the ids of individuals whose sources and
+    SubPedigrees may have changed: those added, removed or edited, their
+    old and new parents (who may gain or lose a couple), their spouses (who
+    may stop being founders) and all of their descendants in either version.
+    """
+    new_records = struct_records(ped_tree)
+    changed = set()
+    parents = set() # old and new parents of changed individuals
+    for id in old_records.keys() | new_records.keys():
+        if old_records.get(id) != new_records.get(id):
+            changed.add(id)
+            for record in (old_records.get(id),new_records.get(id)):
+                if record != None:
+                    parents.add(record[0])
+                    parents.add(record[1])
+
+    region = changed | parents
+    for records in (old_records,new_records):
+        children = {} # id -> ids of children in this version
+        for id,(p_id,m_id,sex) in records.items():
+            children.setdefault(p_id,[]).append(id)
+            children.setdefault(m_id,[]).append(id)
+            #add spouses of changed individuals
+            if p_id in changed or m_id in changed:
+                region.add(p_id)
+                region.add(m_id)
+        region.discard("0")
+
+        #add descendants in this version
+        stack = list(region)
+        while len(stack) != 0:
+            for child in children.get(stack.pop(),[]):
+                if not child in region:
+                    region.add(child)
+                    stack.append(child)
+    return region
+
+def update_options(ped_tree,IBDs,cache,args,found,skipped=None):
+    """
+    Yields SubPedigrees from a pickled cache (saved with an earlier version
+    of the pedigree structure) for each cohort, only searching again for
+    cohorts with a member in the changed region of the pedigree (see
+    changed_region) or missing from the cache. Cohorts come from the IBDs,
+    or from the cache when processing by chromosome (when resolved haplotypes
+    are not known). Searches use the source, maximum complexity and
+    haplotype option the cache was saved with. Cohorts over the time
+    limits are added to skipped (see generate_options).
+    """
+    region = changed_region(cache["struct"],ped_tree)
+    cached = {}
+    for cohort,subpeds in cache["cohorts"]:
+        if region.isdisjoint(cohort):
+            cached[tuple(sorted(cohort))] = subpeds
+
+    cache_args = argparse.Namespace(**vars(args))
+    cache_args.source = cache["source"]
+    cache_args.max_component_size = cache["max_component_size"]
+    cache_args.haplotypes = cache.get("haplotypes",False)
+
+    cohorts = [cohort for cohort,subpeds in cache["cohorts"]]
+    haps = None
+    if IBDs != None:
+        cohorts = list(generate_cohorts(IBDs))
+        haps = generate_haps(ped_tree,IBDs,cache_args)
+    if not args.quiet:
+        reused = len([cohort for cohort in cohorts if tuple(sorted(cohort)) in cached])
+        print("reusing sub-pedigrees for " + str(reused) + "/" + str(len(cohorts)) + \
+            " cohorts (" + str(len(region)) + " individuals affected by pedigree changes)")
+
+    return generate_options(ped_tree,cohorts,cache_args,found,cached,haps,skipped)
+
+def generate_cohorts(IBDs):
+    """
+    Yields the list of individual ids (strings)
+    sharing each IBD.
+    """
+    for selected_ibd in IBDs:
+        starting_indvs = []
+        for indv in selected_ibd.get_indvs():
+            starting_indvs.append(indv)
+        yield starting_indvs
+
+def generate_haps(ped_tree,IBDs,args):
+    """
+    Yields the resolved haplotypes (see IBD.resolved_haps) of
+    each IBD's individuals, or returns None if they aren't used.
+    """
+    if not args.haplotypes:
+        return None
+    return (IBD.resolved_haps(selected_ibd,ped_tree) for selected_ibd in IBDs)
+
+def generate_options(ped_tree,cohorts,args,found=None,cached=None,haps=None,skipped=None):
+    """
+    Yields SubPedigrees for each cohort (list of ids)
+    as soon as they are found. Each cohort and its SubPedigrees
+    are added to found (list) if given. Cohorts in cached
+    (dictionary of sorted cohort tuples to SubPedigrees) are
+    not searched again. haps (if given) yields the resolved
+    haplotypes for each cohort (see generate_haps). With time
+    limits, cohorts not searched in time are left out and their
+    numbers and cohorts added to skipped (list) if given.
+    """
+    #precompute the part of the pedigree below a preselected source
+    source_region = None
+    if args.source != None:
+        source_region = get_source_region(ped_tree,args.source)
+
+    pruned = []
+    if skipped == None:
+        skipped = []
+    if args.time_limit != None or args.cohort_time_limit != None:
+        searches = search_anytime(ped_tree,cohorts,args,source_region,cached,haps,pruned,skipped)
+    elif args.processes > 1 and "fork" in multiprocessing.get_all_start_methods():
+        searches = search_families(ped_tree,cohorts,args,source_region,cached,haps,pruned)
+    else:
+        searches = search_cohorts(ped_tree,cohorts,args,source_region,cached,haps,pruned)
+    for cohort,cohort_options in searches:
+        if found != None:
+            found.append((cohort,cohort_options))
+        for option in cohort_options:
+            yield option
+
+    if not args.quiet and args.max_component_size != None:
+        print("pruned " + str(len(pruned)) + " sub-pedigrees over the maximum complexity")
+
+def search_cohorts(ped_tree,cohorts,args,source_region,cached,haps,pruned):
+    """
+    Yields each cohort and its SubPedigrees (see generate_options),
+    adding the ids of sources over the maximum complexity to pruned
+    """
+    for cohort in cohorts:
+        cohort_haps = None
+        if haps != None:
+            cohort_haps = next(haps)
+        if cached != None and tuple(sorted(cohort)) in cached:
+            cohort_options = cached[tuple(sorted(cohort))]
+        else:
+            cohort_options = find_min_pedigree(ped_tree,cohort,args.source,args.quiet,source_region,args.max_component_size,pruned,cohort_haps)
+        yield cohort,cohort_options
+
+class CohortTimeout(Exception):
+    """Raised (by an alarm signal) when a cohort's search runs out of time"""
+
+def raise_timeout(signum,frame):
+    raise CohortTimeout()
+
+def estimate_cost(ped_tree,cohort):
+    """
+    A rough cost of searching a cohort: the number of its
+    members in the pedigree times the size of their ancestor tree
+    """
+    members = [id for id in cohort if id in ped_tree.indvs]
+    ancestors = set()
+    for id in members:
+        ancestors |= ped_tree.ancestors(id)
+    return len(members) * len(ancestors)
+
+def search_anytime(ped_tree,cohorts,args,source_region,cached,haps,pruned,skipped):
+    """
+    Same as search_cohorts, but within args.time_limit seconds for the
+    whole search and args.cohort_time_limit seconds for each cohort (either
+    can be None). Cohorts are searched cheapest first (see estimate_cost).
+    A search still running when its time is up is stopped by an alarm
+    signal, and cohorts left once the whole search is out of time are not
+    started. The numbers and cohorts of these are added to skipped. Yields
+    the other cohorts in their original order.
+    NOTE: alarms only work in the main thread on unix, elsewhere searches
+    can't be stopped and are only skipped once the whole search is out of time.
+    """
+    start = time.time()
+    cohorts = list(cohorts)
+    cohort_haps = [None] * len(cohorts)
+    if haps != None:
+        cohort_haps = list(haps)
+
+    options = {} # cohort number -> SubPedigrees
+    order = [] # numbers of the cohorts to search
+    for i in range(len(cohorts)):
+        if cached != None and tuple(sorted(cohorts[i])) in cached:
+            options[i] = cached[tuple(sorted(cohorts[i]))]
+        else:
+            order.append(i)
+    order.sort(key=lambda i: estimate_cost(ped_tree,cohorts[i]))
+
+    alarm = hasattr(signal,"setitimer") and threading.current_thread() is threading.main_thread()
+    if alarm:
+        old_handler = signal.signal(signal.SIGALRM,raise_timeout)
+    try:
+        for i in order:
+            budget = args.cohort_time_limit
+            if args.time_limit != None:
+                left = args.time_limit - (time.time() - start)
+                if budget == None or left < budget:
+                    budget = left
+            if budget <= 0:
+                skipped.append((i,cohorts[i]))
+                continue
+            cohort_pruned = []
+            try:
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL,budget)
+                options[i] = find_min_pedigree(ped_tree,cohorts[i],args.source,args.quiet,source_region,args.max_component_size,cohort_pruned,cohort_haps[i])
+                if alarm:
+                    signal.setitimer(signal.ITIMER_REAL,0)
+            except CohortTimeout:
+                skipped.append((i,cohorts[i]))
+                continue
+            pruned += cohort_pruned
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL,0)
+            signal.signal(signal.SIGALRM,old_handler)
+
+    skipped.sort(key=lambda entry: entry[0])
+    for i in range(len(cohorts)):
+        if i in options:
+            yield cohorts[i],options[i]
+
+#pedigree and search options for search_family, set before
+#worker processes are forked so they don't need to be copied
+family_search = None
+
+def search_family(family_cohorts):
+    """
+    Finds SubPedigrees for a list of (cohort, haps), from one or
+    more families. Runs in a worker process. Returns a list of (SubPedigrees,
+    ids of sources over the maximum complexity) for each cohort.
+    """
+    ped_tree,source,source_region,max_complexity = family_search
+    family_options = []
+    for cohort,haps in family_cohorts:
+        pruned = []
+        cohort_options = find_min_pedigree(ped_tree,cohort,source,True,source_region,max_complexity,pruned,haps)
+        family_options.append((cohort_options,pruned))
+    return family_options
+
+def search_families(ped_tree,cohorts,args,source_region,cached,haps,pruned):
+    """
+    Same as search_cohorts, but groups the cohorts to search by family (see
+    PedigreeTree.family_of) and searches the families in parallel in
+    args.processes worker processes. Cohorts spread over several families
+    are rejected without a search. Families are handed to the processes in
+    a few batches each, balanced by number of cohorts. Yields cohorts in
+    their original order.
+    """
+    global family_search
+    cohorts = list(cohorts)
+    cohort_haps = [None] * len(cohorts)
+    if haps != None:
+        cohort_haps = list(haps)
+
+    options = {} # cohort number -> SubPedigrees, if not searched
+    families = {} # family number -> numbers of its cohorts to search
+    for i in range(len(cohorts)):
+        family = ped_tree.family_of(cohorts[i])
+        if cached != None and tuple(sorted(cohorts[i])) in cached:
+            options[i] = cached[tuple(sorted(cohorts[i]))]
+        elif family == None:
+            options[i] = []
+        else:
+            families.setdefault(family,[]).append(i)
+    if not args.quiet:
+        print("searching " + str(len(cohorts) - len(options)) + " cohorts in " + str(len(families)) + \
+            " families with " + str(args.processes) + " processes")
+
+    #largest families first, each to the batch with the fewest cohorts
+    batches = [[] for i in range(min(len(families),4 * args.processes))]
+    for family in sorted(families,key=lambda family: -len(families[family])):
+        min(batches,key=len).extend(families[family])
+
+    family_search = (ped_tree,args.source,source_region,args.max_component_size)
+    context = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(args.processes,mp_context=context) as pool:
+        searches = {} # cohort number -> (future for its batch, position in batch)
+        for numbers in batches:
+            future = pool.submit(search_family,[(cohorts[i],cohort_haps[i]) for i in numbers])
+            for pos in range(len(numbers)):
+                searches[numbers[pos]] = (future,pos)
+
+        for i in range(len(cohorts)):
+            if i in options:
+                yield cohorts[i],options[i]
+                continue
+            future,pos = searches[i]
+            cohort_options,cohort_pruned = future.result()[pos]
+            pruned += cohort_pruned
+            yield cohorts[i],cohort_options
+    family_search = None
+
+def generate_options_by_chromosome(ped_tree,args,found=None):
+    """
+    Finds SubPedigrees one chromosome at a time so only one chromosome's
+    IBDs are in memory. The SubPedigrees for each chromosome are grouped by
+    source and stored in the args.by_chromosome directory, then all stored
+    SubPedigrees are yielded one chromosome at a time to be merged.
+    """
+    if not os.path.exists(args.by_chromosome):
+        os.makedirs(args.by_chromosome)
+
+    #find where each chromosome is in the GERMLINE file(s)
+    chrom_runs = IBD.index_chromosomes(args.germ_filename)
+
+    spill_filenames = []
+    for chrom in sorted(chrom_runs.keys()):
+        if not args.quiet:
+            print("finding sub-pedigrees for chromosome " + str(chrom),end='\r')
+        IBDs = IBD.read_chromosome(chrom_runs[chrom],[],args.merge_gap)
+        chrom_options = group_options(generate_options(ped_tree,generate_cohorts(IBDs),args,found))
+
+        spill_filename = os.path.join(args.by_chromosome,"chr" + str(chrom) + ".pkl")
+        spill_file = open(spill_filename,"wb")
+        pickle.dump(chrom_options,spill_file)
+        spill_file.close()
+        spill_filenames.append(spill_filename)
+        del IBDs, chrom_options
+    if not args.quiet:
+        print("\033[K",end='\r')
+
+    for spill_filename in spill_filenames:
+        spill_file = open(spill_filename,"rb")
+        chrom_options = pickle.load(spill_file)
+        spill_file.close()
+        for source in chrom_options.keys():
+            for option in chrom_options[source]:
+                yield option
+
+def write_options(options,args):
+    """
+    group_options, writing each kept SubPedigree to the -j JSON lines
+    file if one was given
+    """
+    jsonl_file = None
+    if args.jsonl_filename != None:
+        jsonl_file = open(args.jsonl_filename,"w")
+
+    source_options = group_options(options,jsonl_file)
+
+    if jsonl_file != None:
+        jsonl_file.close()
+        if not args.quiet:
+            print("sub-pedigrees stored in " + args.jsonl_filename)
+    return source_options
+
+def group_options(options,jsonl_file=None):
+    """
+    Takes an iterable of SubPedigrees and returns a dictionary
+    of sources and a list of SubPedigrees for each source, without
+    SubPedigrees that have the same members as an earlier one.
+    Each kept SubPedigree is written as a line of JSON to the
+    jsonl_file if given.
+    """
+    source_options = {}
+    mem_lists = {} # source id -> set of MemberSets already kept
+    for option in options:
+        if not option.source in source_options:
+            source_options[option.source] = []
+            mem_lists[option.source] = set()
+
+        #compares members of each SubPedigree
+        if option.members in mem_lists[option.source]:
+            continue
+        source_options[option.source].append(option)
+        mem_lists[option.source].add(option.members)
+
+        if jsonl_file != None:
+            jsonl_file.write(json.dumps({"source": option.source, \
+                "cohorts": option.cohorts, "mem_ids": option.mem_ids}) + "\n")
+            jsonl_file.flush()
+
+    return source_options
+
+def remove_redundant_peds(options):
+    """
+    Takes a list of SubPedigrees for a single source and returns
+    the list without SubPedigrees that have the same members as
+    an earlier one.
+    """
+    new_options = []
+    mem_lists = set()
+    #compares members of each SubPedigree
+    for option in options:
+        if not option.members in mem_lists:
+            new_options.append(option)
+            mem_lists.add(option.members)
+    return new_options
+    
+def select_sources(cohort,args):
+    """
+    Prompts user for one or more sources (or takes those
+    given at the command line). Returns a list of source ids.
+    """
+    source_options = cohort.source_options()
+
+    if args.sources != None: #use preselected sources if given in command line
+        selected_sources = []
+        for source in args.sources:
+            source = source.replace('+','&')
+            if not source in source_options.keys():
+                print("could not find selected source " + source)
+                exit()
+            selected_sources.append(source)
+        return selected_sources
+
+    i = 0
+    sorted_ids = []
+    if isinstance(source_options,SourceIndex):
+        #print approximate counts and sizes for each indexed source
+        for source_id in sorted(source_options.keys()):
+            if i % 20 == 0:
+                print("source\t\t\tcohorts\t\tmin mems\tmax mems")
+            sorted_ids.append(source_id)
+            spacing = "" #adjusts spacing for clarity
+            while len("[" + str(i) + "] " + source_id + spacing) < 17:
+                spacing += " "
+            print("[" + str(i) + "] " + source_id + spacing + "\t~" + str(len(source_options.cohorts[source_id])) + \
+                "\t\t>=" + str(source_options.min_sizes[source_id]) + "\t\t<=" + str(len(source_options.max_mems[source_id])))
+            i+= 1
+    elif isinstance(source_options,ResultIndex) and args.max_component_size == None:
+        #print saved counts and sizes without reading each source's SubPedigrees
+        for source_id in sorted(source_options.keys()):
+            if i % 20 == 0:
+                print("source\t\t\tped count\ttotal mems")
+            sorted_ids.append(source_id)
+            spacing = "" #adjusts spacing for clarity
+            while len("[" + str(i) + "] " + source_id + spacing) < 17:
+                spacing += " "
+            summary = source_options.summaries[source_id]
+            print("[" + str(i) + "] " + source_id + spacing + "\t" + str(summary["ped_count"]) + "\t\t" + str(summary["total_mems"]))
+            i+= 1
+    else:
+        #print an option for each source
+        for source_id in sorted(source_options.keys()):
+            #find the union of valid subpeds given maximum allowed complexity
+            try:
+                subpeds = cohort.valid_subpeds(source_id)
+                min_size,max_size = cohort.size_range(source_id)
+            except ValueError: #only show options that have some valid subped
+                continue
+            if i % 20 == 0:
+                print("source\t\t\tped count\ttotal mems")
+            sorted_ids.append(source_id)
+            spacing = "" #adjusts spacing for clarity
+            while len("[" + str(i) + "] " + source_id + spacing) < 17:
+                spacing += " "
+            print("[" + str(i) + "] " + source_id + spacing + "\t" + str(len(subpeds)) + "\t\t" + str(max_size))
+            i+= 1
+
+    selected_sources = None
+    while selected_sources == None: #continue prompt until a valid input is received
+        user_in = input("Please select one or more sources from the list above (separated by spaces): ")
+        choices = user_in.replace(","," ").split()
+
+        #prevent invalid input
+        if len(choices) == 0 or not all(choice.isdigit() and int(choice) < len(sorted_ids) for choice in choices):
+            print("Invalid input. Please input numbers from the lists above.")
+        else:
+            selected_sources = []
+            for choice in choices:
+                if not sorted_ids[int(choice)] in selected_sources:
+                    selected_sources.append(sorted_ids[int(choice)])
+    return selected_sources
+
+def get_user_selection(cohort,args,selected_source):
+    """
+    Prompts user for a target pedigree size for a
+    source. Returns a SubPedigree of the proper size.
+    """
+    #get valid SubPedigrees for the chosen source and their size range
+    try:
+        subpeds = cohort.valid_subpeds(selected_source)
+        min_size,max_size = cohort.size_range(selected_source)
+    except ValueError as e:
+        print(e)
+        exit()
+    print("for " + selected_source + " combined pedigree sizes range from " + str(min_size) + " to " + str(max_size))
+
+    joined_ped = None
+    #find SubPedigree based on user selected size
+    while joined_ped == None:
+        user_in = input("Please select a desired pedigree size in the range above: ")
+        #prevent invalid inputs
+        if not user_in.isdigit() or int(user_in) < min_size or int(user_in) > max_size:
+            print("Invalid input. Please input a number in the range above.")
+        else:
+            target_size = int(user_in)
+            #search for options of target size
+            low_option,high_option = cohort.join(selected_source,target_size)
+            
+            #found SubPedigree of exact specified size
+            if low_option == high_option:
+                joined_ped = low_option
+
+                #find minimum and maximum sizes of joined subpeds
+                cohort_min,cohort_max = get_component_sizes(joined_ped,subpeds)
+
+                #print outcome
+                if not args.quiet:
+                    print("found pedigree of desired size by joining sub-peds of sizes "  + str(cohort_min) + "-" + str(cohort_max)   + \
+                    " from " + str(len(joined_ped.cohorts)) + " different IBD cohorts")
+                
+                if args.component_filename != None:
+                    create_component_files(cohort.ped_tree,args,joined_ped,subpeds)
+                
+            #If not exact pedigree was found, show closest sizes and reprompt
+            else:
+                print("could not be matched exactly, closest sizes are " + str(len(low_option.members)) + " and " + str(len(high_option.members)))
+    
+    return joined_ped
+
+def get_size_selections(cohort,args,sources):
+    """
+    Prompts user for target pedigree sizes for each source (or
+    uses the target sizes given at the command line). Returns a
+    list of (source id, size) pairs.
+    """
+    selections = []
+    for source in sources:
+        try:
+            min_size,max_size = cohort.size_range(source)
+        except ValueError as e:
+            print(e)
+            continue
+        print("for " + source + " combined pedigree sizes range from " + str(min_size) + " to " + str(max_size))
+
+        sizes = None
+        if args.target_sizes != None:
+            sizes = [size for size in args.target_sizes if size >= min_size and size <= max_size]
+            if len(sizes) != len(args.target_sizes):
+                print("skipping target sizes outside of this range for " + source)
+        while sizes == None: #continue prompt until a valid input is received
+            user_in = input("Please select desired pedigree sizes in the range above (separated by spaces): ")
+            choices = user_in.replace(","," ").split()
+            #prevent invalid inputs
+            if len(choices) == 0 or not all(choice.isdigit() and int(choice) >= min_size \
+                and int(choice) <= max_size for choice in choices):
+                print("Invalid input. Please input numbers in the range above.")
+            else:
+                sizes = [int(choice) for choice in choices]
+        for size in sizes:
+            if not (source,size) in selections:
+                selections.append((source,size))
+    return selections
+
+def join_selections(cohort,args,selections):
+    """
+    Joins and writes the pedigrees for each (source id, size)
+    selection, in a pool of worker processes where they can be
+    forked (otherwise one at a time). Valid SubPedigrees are found
+    once, before the workers start, and shared by them. What each
+    selection prints is printed in the order of the selections.
+    """
+    global selected_cohort
+    for source in set(source for source,size in selections):
+        cohort.valid_subpeds(source)
+
+    selected_cohort = cohort
+    pool = None
+    joined = map(join_selection,selections)
+    if args.workers > 1 and len(selections) > 1 and "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        pool = concurrent.futures.ProcessPoolExecutor(min(args.workers,len(selections)),mp_context=context)
+        joined = pool.map(join_selection,selections)
+    for matched,printed,message in joined:
+        sys.stdout.write(printed)
+        if not matched or not args.quiet:
+            print(message)
+    if pool != None:
+        pool.shutdown()
+    selected_cohort = None
+
+#Cohort for join_selection, set before worker
+#processes are forked so it doesn't need to be copied
+selected_cohort = None
+
+def join_selection(selection):
+    """
+    Joins and writes a (source id, size) selection of selected_cohort
+    (see write_selection). Returns whether the size was matched exactly,
+    what was printed while writing it and a message.
+    """
+    source,size = selection
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        matched,message = write_selection(selected_cohort,selected_cohort.args,source,size)
+    return matched,printed.getvalue(),message
+
+def write_selection(cohort,args,source,size):
+    """
+    Joins a source's SubPedigrees to a target size and writes the
+    output files for it, named with the source and size.
+    Returns whether the size was matched exactly and a message.
+    """
+    low_option,high_option = cohort.join(source,size)
+    if low_option != high_option:
+        return False,"for " + source + " size " + str(size) + " could not be matched exactly, closest sizes are " + \
+            str(len(low_option.members)) + " and " + str(len(high_option.members))
+
+    if args.output_filename != None:
+        cohort.write_struct(selection_filename(args.output_filename,source,size),low_option)
+    input_ped = None
+    if args.pedigree_filenames != None:
+        input_ped = args.pedigree_filenames[0]
+        cohort.write_ped(input_ped,selection_filename(args.pedigree_filenames[1],source,size),low_option)
+    if args.component_filename != None:
+        cohort.write_components(selection_filename(args.component_filename,source,size),low_option,input_ped)
+
+    cohort_min,cohort_max = get_component_sizes(low_option,cohort.valid_subpeds(source))
+    return True,"for " + source + " found pedigree of size " + str(size) + " by joining sub-peds of sizes " + \
+        str(cohort_min) + "-" + str(cohort_max) + " from " + str(len(low_option.cohorts)) + " different IBD cohorts"
+
+def selection_filename(filename,source,size):
+    """
+    Adds a source (with + for couples) and size to
+    a file name, before its extension if it has one
+    """
+    compressed_ext = ""
+    if filename.endswith(".gz"):
+        filename = filename[:-3]
+        compressed_ext = ".gz"
+    base,ext = os.path.splitext(filename)
+    return base + "_" + source.replace('&','+') + "_" + str(size) + ext + compressed_ext
+
+def get_valid_subpeds(ped_tree,options,max_complexity):
+    """
+    Takes a list of SubPedigrees for a single source and returns
+    those within the maximum bit complexity (if given), the size
+    of the smallest of them, and the union of their members (the
+    minimum and maximum sizes of a joined pedigree).
+    """
+    full_ped = set()
+    subpeds = []
+    min_size = None
+    for option in options:
+        #only use valid SubPedigrees
+        if max_complexity == None or get_bit_complexity(ped_tree,option.members) <= max_complexity:
+            full_ped.update(option.members)
+            subpeds.append(option)
+            #use smallest SubPedigree for minimum size
+            if min_size == None or len(option.members) < min_size:
+                min_size = len(option.members)
+    return subpeds,min_size,list(full_ped)
+
+def get_component_sizes(joined_ped,subpeds):
+    """
+    Returns the minimum and maximum sizes of the
+    SubPedigrees that were joined into joined_ped.
+    """
+    cohort_min = len(joined_ped.members)
+    cohort_max = 0
+    for min_ped in subpeds:
+        if min_ped.cohorts[0] in joined_ped.cohorts:
+            if len(min_ped.members) < cohort_min:
+                cohort_min = len(min_ped.members)
+            if len(min_ped.members) > cohort_max:
+                cohort_max = len(min_ped.members)
+    return cohort_min,cohort_max
+
+def find_joined_ped(source,subpeds,target_size,max_size):
+    """
+    Base call for recursive algorithm to join subpeds to
+    get a subped of target size. Uses dynamic approach.
+
+    Uses a dynamic approach with a table that has # subpeds
+    rows and maximum pedigree size columns (size of the union
+    of all subpeds).
+
+    Returns closest Subpedigrees above and below the
+    target size.
+    """
+    #create table for dynamic approach
+    table = []
+    for i in range(len(subpeds)): #create rows
+        row = []
+        for j in range(max_size): #create columns
+            row.append(None) #all cell start as 'None'
+        table.append(row)
+
+    #increase recursion limit
+    if sys.getrecursionlimit() < max_size**2:
+        sys.setrecursionlimit(max_size**2)
+
+    #make first recursive call.
+    low_option,high_option = join_peds(table,subpeds,target_size,SubPedigree(source,[],MemberSet()),0)
+    return low_option,high_option
+
+
+def join_peds(table,subpeds,target_size,current_ped,list_num):
+    """
+    Recursive step for joining SubPedigrees.
+    returns closest subpeds below and above target size.
+
+    At each iterationtable indexed by list_num (the first
+    list_num cohort subpeds that have been checked) and list_size
+    (the size of the current given SubPedigree).
+    """
+    list_size = len(current_ped.members)
+
+    '''Base Cases'''
+
+    #case: if the best SubPedigree has already been computed
+    if table[list_num][list_size] != None:
+        return table[list_num][list_size][0],table[list_num][list_size][1]
+
+    #add the list_num cohort ped to the current ped
+    new_cohorts = current_ped.cohorts + subpeds[list_num].cohorts
+    new_members = current_ped.members | subpeds[list_num].members
+    new_ped = SubPedigree(current_ped.source,new_cohorts,new_members)
+
+    #case: we've found a subped of target size
+    if len(new_members) == target_size:
+        table[list_num][list_size] = (new_ped,new_ped)
+        return new_ped,new_ped
+    #we are at the last cohort subped
+    elif list_num + 1 == len(subpeds):
+        table[list_num][list_size] = (current_ped,new_ped)
+        return current_ped,new_ped
+    
+    '''Recursive Cases'''
+
+    low_option = current_ped
+    high_option = None
+
+    
+    if len(new_ped.members) > target_size:
+        high_option = new_ped
+    else: #only need to join more peds if new_ped size is less than target size
+        low_option = new_ped #target_size > new_ped size >= current_ped size
+        #case: join new_ped with subpeds after list_num (keep subpeds[list_num] in the union)
+        recurse_low,recurse_high = join_peds(table,subpeds,target_size,new_ped,list_num+1)
+        high_option = recurse_high #take the only high option
+        #pick the better low option
+        if len(recurse_low.members) > len(low_option.members):
+            low_option = recurse_low
+
+    if len(low_option.members) != target_size and len(high_option.members) != target_size:
+        #case: join current_ped with subpeds after list_num (don't keep subpeds[list_num] in the union)
+        recurse_low,recurse_high = join_peds(table,subpeds,target_size,current_ped,list_num+1)
+        #pick the better low option
+        if len(recurse_low.members) > len(low_option.members):
+            low_option = recurse_low
+        #pick the better high option
+        if len(recurse_high.members) >= target_size and len(recurse_high.members) < len(high_option.members):
+            high_option = recurse_high
+    
+    #if either option is of target size, set both options to be the target size option
+    if len(low_option.members) == target_size:
+        high_option = low_option
+    elif len(high_option.members) == target_size:
+        low_option = high_option
+    
+    #fill out the table
+    table[list_num][list_size] = (low_option,high_option)
+    return low_option,high_option
+
+
+def create_component_files(ped_tree,args,full_ped,subpeds):
+    """
+    Creates a .ped file (or .bed/.bim/.fam files if the
+    bed option is set or the input is a .bed file) for
+    each component that made up the final chosen pedigree.
+    """
+
+    #get list of components
+    components = get_ped_components(full_ped,subpeds)
+
+    pedfile_lines = None
+    genotypes = None
+    if args.pedigree_filenames != None and (args.bed or plink.is_bed(args.pedigree_filenames[0])):
+        #read members once, coding alleles the same way in every component
+        genotypes,bim = read_genotypes(args.pedigree_filenames[0],full_ped.mem_ids)
+    elif args.pedigree_filenames != None:
+        pedfile = compressed.open_input(args.pedigree_filenames[0])
+        pedfile_lines = pedfile.readlines()
+        pedfile.close()
+
+    if pedfile_lines != None: #only create ped files if pedigree input is specified
+        line_dict = {}
+
+        #find the number of SNP markers in each line of the pedigree
+        markers = len(pedfile_lines[0].split()) - 6
+
+        #create a dictionary of all lines in the full pedigree
+        for line in pedfile_lines:
+            words = line.split()
+            line_dict[words[1]] = words
+
+    
+    for i in range(len(components)): #iterate through the components
+        if not args.quiet:
+            print("creating component file " + str(i+1) + "/" + str(len(components)),end='\r')
+        #create files
+        component = components[i]
+        outfile_name = ped_output_name(args.component_filename + "_" + str(i) + ".ped",args.bgzip)
+        textfile_name = args.component_filename + "_" + str(i) + ".txt"
+        if genotypes != None:
+            write_bed_members(args.component_filename + "_" + str(i),ped_tree,component.mem_ids,genotypes,bim)
+        elif pedfile_lines != None:
+            outfile = compressed.open_output(outfile_name,args.bgzip)
+        textfile = open(textfile_name, "w")
+        textfile.write("ID FATHER MOTHER SEX") #write header
+
+
+        for id in component.mem_ids: #write line for each member of the component pedigree
+            indv = ped_tree.indvs[id]
+            #only put parents for an individual if they are also in the component pedigree
+            dad = "0"
+            mom = "0"
+            if indv.p_id in component.members and indv.m_id in component.members:
+                dad = indv.p_id
+                mom = indv.m_id
+            #write line to .txt file
+            out_line = id + " " + dad + " " + mom + " " + str(indv.sex)
+            textfile.write("\n" + out_line)
+            if pedfile_lines != None:
+                #write line to .ped file
+                out_line = "1 " + out_line #+ " 0"
+                if id in line_dict.keys(): #write haplotypes if known
+                    words = line_dict[id]
+                    for j in range(6,len(words)):
+                        out_line += " " + words[j]
+                else: #write zeros if haplotypes are unknown
+                    for j in range(markers):
+                        out_line += " 0"
+                outfile.write(out_line + "\n")
+        if pedfile_lines != None:
+            outfile.close()
+        textfile.close()
+        if not args.quiet:
+            print("\033[K",end='\r')
+    
+    return len(components)
+
+    
+
+def get_ped_components(full_ped,subpeds):
+    """
+    Searches through a list of subpeds and
+    find which are components of the full ped
+    based on the cohorts in the full ped.
+    """
+    components = []
+    for cohort in full_ped.cohorts:
+        for subped in subpeds:
+            if subped.cohorts[0] == cohort:
+                components.append(subped)
+                break
+    #print(len(components))
+    return components
+
+
+
+def get_bit_complexity(ped_tree,mem_ids):
+    """
+    calculate the bit complexity of a pedigree
+    based on a list (or MemberSet) of member ids.
+    """
+    n = 0
+    f = 0
+    g = []
+    for id in mem_ids:
+        indv = ped_tree.indvs[id]
+        #check if parents are in the pedigree
+        if indv.p_id in mem_ids and indv.m_id in mem_ids:
+            n += 1
+        else:
+            f +=1
+            #add couples that are both founders
+            for couple in indv.couples:
+                if not couple in g \
+                    and couple.p.id in mem_ids and couple.m.id in mem_ids \
+                    and not couple.p.p_id and not couple.p.m_id in mem_ids \
+                    and not couple.m.p_id and not couple.m.m_id in mem_ids:
+                    g.append(couple)
+
+    
+    return 2*n-f-len(g)
+
+def answer_query(cohort,query):
+    """
+    Answers a query (dictionary loaded from JSON) about a Cohort
+    and returns a dictionary to send back as JSON. Raises a
+    ValueError for invalid queries.
+    """
+    kind = query.get("query")
+    if kind == "sources":
+        return {"sources": cohort.sources()}
+
+    if not "source" in query:
+        raise ValueError("query needs a source")
+    source = str(query["source"]).replace('+','&')
+    if kind == "range":
+        min_size,max_size = cohort.size_range(source)
+        return {"source": source, "ped_count": len(cohort.valid_subpeds(source)), \
+            "min_size": min_size, "max_size": max_size}
+
+    if not "size" in query or not str(query["size"]).isdigit():
+        raise ValueError("query needs a pedigree size")
+    size = int(query["size"])
+    low_option,high_option = cohort.join(source,size)
+    if kind == "join":
+        answer = {"source": source, "size": size, "exact": low_option == high_option, \
+            "low": len(low_option.members), "high": len(high_option.members)}
+        if low_option == high_option:
+            cohort_min,cohort_max = get_component_sizes(low_option,cohort.valid_subpeds(source))
+            answer["mem_ids"] = sorted(low_option.mem_ids)
+            answer["cohorts"] = low_option.cohorts
+            answer["component_min"] = cohort_min
+            answer["component_max"] = cohort_max
+        return answer
+
+    if kind == "export":
+        if low_option != high_option:
+            raise ValueError("could not be matched exactly, closest sizes are " + \
+                str(len(low_option.members)) + " and " + str(len(high_option.members)))
+        files = []
+        if query.get("output_filename") != None:
+            cohort.write_struct(query["output_filename"],low_option)
+            files.append(query["output_filename"])
+        pedigree_filenames = query.get("pedigree_filenames")
+        if pedigree_filenames != None:
+            files.append(cohort.write_ped(pedigree_filenames[0],pedigree_filenames[1],low_option))
+        if query.get("component_filename") != None:
+            input_ped = None
+            if pedigree_filenames != None:
+                input_ped = pedigree_filenames[0]
+            count = cohort.write_components(query["component_filename"],low_option,input_ped)
+            for i in range(count):
+                files.append(query["component_filename"] + "_" + str(i) + ".txt")
+                if input_ped != None and (cohort.args.bed or plink.is_bed(input_ped)):
+                    files.append(query["component_filename"] + "_" + str(i) + ".bed")
+                elif input_ped != None:
+                    files.append(ped_output_name(query["component_filename"] + "_" + str(i) + ".ped",cohort.args.bgzip))
+        return {"source": source, "size": size, "files": files}
+
+    raise ValueError("unknown query " + str(kind))
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers JSON queries POSTed to the query server, for example
+    {"query": "join", "source": "h+g", "size": 12}
+    """
+    def do_POST(self):
+        status = 200
+        try:
+            length = int(self.headers.get("Content-Length",0))
+            query = json.loads(self.rfile.read(length))
+            answer = answer_query(self.server.cohort,query)
+        except (ValueError,AttributeError,LookupError,TypeError) as e:
+            #malformed JSON or a query missing or misusing a field
+            status = 400
+            answer = {"error": str(e)}
+        except Exception as e:
+            #could not write an export, or a failure while joining
+            status = 500
+            answer = {"error": type(e).__name__ + ": " + str(e)}
+        body = json.dumps(answer).encode()
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        if not self.server.cohort.args.quiet:
+            http.server.BaseHTTPRequestHandler.log_message(self,format,*args)
+
+class QueryServer(http.server.HTTPServer):
+    """
+    HTTP server on localhost answering queries for a
+    Cohort from a pool of worker threads.
+    """
+    def __init__(self,cohort,port,workers):
+        #set before binding, since a failed bind calls server_close
+        self.cohort = cohort
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        http.server.HTTPServer.__init__(self,("127.0.0.1",port),QueryHandler)
+
+    def process_request(self,request,client_address):
+        #joins recurse deeply, so the pool's workers (started as requests
+        #arrive) need larger stacks, without changing other threads
+        old_size = threading.stack_size(64*1024*1024)
+        try:
+            self.pool.submit(self.process_request_thread,request,client_address)
+        finally:
+            threading.stack_size(old_size)
+
+    def process_request_thread(self,request,client_address):
+        try:
+            self.finish_request(request,client_address)
+        except Exception:
+            self.handle_error(request,client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        http.server.HTTPServer.server_close(self)
+        self.pool.shutdown()
+
+def serve(cohort,args):
+    """
+    Answers queries about a loaded Cohort on
+    localhost until interrupted.
+    """
+    server = QueryServer(cohort,args.serve,args.workers)
+    if not args.quiet:
+        print("answering queries on http://127.0.0.1:" + str(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
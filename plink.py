@@ -0,0 +1,185 @@
+"""
+Reading and writing of PLINK binary (.bed/.bim/.fam) files. Genotypes are
+handled as one column per individual: a bytes object with one 2-bit .bed
+code per variant. Columns are cut out of and packed into the SNP-major
+.bed layout with slice, translate and big integer operations instead of
+one variant at a time.
+"""
+
+# python imports
+import os
+import mmap
+
+BED_MAGIC = b"\x6c\x1b\x01" # .bed magic number, SNP-major mode
+HOM_A1 = 0 # .bed genotype codes
+MISSING = 1
+HET = 2
+HOM_A2 = 3
+
+#for each position of an individual in a .bed byte, a table
+#taking .bed bytes to that individual's code
+SHIFT_TABLES = [bytes([(byte >> (2*k)) & 3 for byte in range(256)]) for k in range(4)]
+
+def is_bed(filename):
+    """Returns True if filename is a PLINK .bed file rather than a .ped file"""
+    return filename.endswith(".bed")
+
+def output_prefix(filename):
+    """Returns the prefix for .bed/.bim/.fam files named like filename"""
+    for ext in (".gz", ".ped", ".bed", ".bim", ".fam"):
+        if filename.endswith(ext):
+            filename = filename[:-len(ext)]
+    return filename
+
+def map_filename(ped_filename):
+    """
+    Returns the .map file next to a .ped file (plain or compressed),
+    or None if there is not one
+    """
+    filename = output_prefix(ped_filename) + ".map"
+    if os.path.exists(filename):
+        return filename
+    return None
+
+def ped_alleles(rows,markers):
+    """
+    Finds the two alleles of each variant in .ped rows (lists of words).
+    Returns a list of [A1, A2] with "0" for alleles never seen.
+    """
+    #one tuple of alleles across all rows for each allele column
+    allele_columns = list(zip(*[words[6:] for words in rows]))
+    alleles = []
+    for j in range(markers):
+        if len(allele_columns) == 0:
+            alleles.append(["0","0"])
+            continue
+        seen = set(allele_columns[2*j])
+        seen.update(allele_columns[2*j+1])
+        seen.discard("0")
+        if len(seen) > 2:
+            raise ValueError("variant " + str(j+1) + " has more than two alleles")
+        alleles.append((sorted(seen) + ["0","0"])[:2])
+    return alleles
+
+def ped_column(words,alleles,tables=None):
+    """
+    Returns the .bed codes (one byte per variant) for a .ped row.
+    tables is a list to reuse genotype code tables in between rows.
+    """
+    if tables == None:
+        tables = []
+    if len(tables) == 0:
+        #most variants share the same alleles, so they share a table
+        shared = {}
+        for a1,a2 in alleles:
+            if not (a1,a2) in shared:
+                table = {a2 + " " + a2: HOM_A2, a1 + " " + a2: HET, \
+                    a2 + " " + a1: HET, a1 + " " + a1: HOM_A1}
+                shared[(a1,a2)] = {genotype: code for genotype,code in table.items() \
+                    if not "0" in genotype.split()}
+            tables.append(shared[(a1,a2)])
+    genotypes = [a + " " + b for a,b in zip(words[6::2],words[7::2])]
+    return bytes([table.get(genotype,MISSING) for table,genotype in zip(tables,genotypes)])
+
+def missing_column(markers):
+    """Returns the .bed codes for an individual with no genotypes"""
+    return bytes([MISSING]) * markers
+
+def bim_lines(map_file,alleles):
+    """
+    Returns .bim lines from a .map file (or numbered placeholder
+    variants if map_file is None) and the alleles of each variant
+    """
+    variants = []
+    if map_file != None:
+        in_file = open(map_file, "r")
+        for line in in_file:
+            words = line.split()
+            if len(words) == 3: #map files may leave out genetic distance
+                words = [words[0],words[1],"0",words[2]]
+            if len(words) == 4:
+                variants.append(words)
+        in_file.close()
+    if len(variants) != len(alleles):
+        if map_file != None:
+            raise ValueError(map_file + " has " + str(len(variants)) + \
+                " variants but the .ped file has " + str(len(alleles)))
+        variants = [["0","snp" + str(j+1),"0","0"] for j in range(len(alleles))]
+    return [" ".join(variants[j] + alleles[j]) for j in range(len(alleles))]
+
+def pack_columns(columns,markers):
+    """
+    Packs the columns of .bed codes into the body of a SNP-major .bed
+    file. Four individuals share each byte, the first in the lowest bits.
+    """
+    row_bytes = (len(columns) + 3) // 4
+    body = bytearray(row_bytes * markers)
+    for group in range(row_bytes):
+        #codes are below 4, so shifting whole columns never carries between variants
+        packed = 0
+        for k in range(4):
+            if 4*group + k < len(columns):
+                packed |= int.from_bytes(columns[4*group + k], "little") << (2*k)
+        body[group::row_bytes] = packed.to_bytes(markers, "little")
+    return body
+
+def write_bed(prefix,fam,bim,columns):
+    """
+    Writes prefix.bed/.bim/.fam from .fam lines, .bim lines and a
+    column of .bed codes for each .fam line. Returns the .bed file name.
+    """
+    out_file = open(prefix + ".fam", "w")
+    for line in fam:
+        out_file.write(line + "\n")
+    out_file.close()
+
+    out_file = open(prefix + ".bim", "w")
+    for line in bim:
+        out_file.write(line + "\n")
+    out_file.close()
+
+    out_file = open(prefix + ".bed", "wb")
+    out_file.write(BED_MAGIC)
+    out_file.write(pack_columns(columns,len(bim)))
+    out_file.close()
+    return prefix + ".bed"
+
+class BedFile:
+    """
+    A PLINK .bed/.bim/.fam trio with the .bed file memory-mapped.
+    Individuals' columns are copied out of it as strided byte slices,
+    so genotypes of individuals that are not needed are never read.
+    """
+    def __init__(self,filename):
+        prefix = output_prefix(filename)
+        self.fam = {} # individual id -> (row in .fam, phenotype)
+        in_file = open(prefix + ".fam", "r")
+        for line in in_file:
+            words = line.split()
+            if len(words) != 0:
+                self.fam[words[1]] = (len(self.fam),words[5])
+        in_file.close()
+
+        in_file = open(prefix + ".bim", "r")
+        self.bim = [line.strip() for line in in_file if line.strip()]
+        in_file.close()
+
+        self.in_file = open(prefix + ".bed", "rb")
+        self.data = mmap.mmap(self.in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.row_bytes = (len(self.fam) + 3) // 4
+        if self.data[:3] != BED_MAGIC:
+            raise ValueError(prefix + ".bed is not a SNP-major .bed file")
+        if len(self.data) != 3 + self.row_bytes * len(self.bim):
+            raise ValueError(prefix + ".bed does not match its .bim and .fam files")
+
+    def column(self,id):
+        """
+        Returns the .bed codes (one byte per variant) of an individual
+        """
+        row = self.fam[id][0]
+        packed = self.data[3 + row // 4::self.row_bytes]
+        return packed.translate(SHIFT_TABLES[row % 4])
+
+    def close(self):
+        self.data.close()
+        self.in_file.close()
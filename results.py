@@ -0,0 +1,231 @@
+"""
+Result files holding the SubPedigrees found for each source, so they can be
+reused without pickle. A result file is a short header followed by sections
+of unsigned 32-bit integer arrays:
+
+    magic line
+    header length (8 bytes, little endian)
+    header (JSON): individual ids, search options, and the byte range of
+        each source's section and of the shared sections
+    sections
+
+Individuals are stored by their number in the header's id list, and each
+SubPedigree's cohorts by their number in the cohorts section. Opening a
+result file only reads the header; sections are read from the memory-mapped
+file when they are needed.
+"""
+
+# python imports
+import array
+import hashlib
+import json
+import mmap
+
+MAGIC = b"ped-cohort results 1\n"
+
+def cohorts_digest(cohorts):
+    """
+    Returns a digest of a list of cohorts (lists of ids) that does not
+    depend on their order, to tell whether results were found for them
+    """
+    lines = sorted(" ".join(sorted(cohort)) for cohort in cohorts)
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()
+
+class ResultWriter:
+    """
+    Numbers individuals and cohorts while sections are encoded,
+    then writes the header and sections to a result file.
+    """
+    def __init__(self):
+        self.ids = [] # number -> individual id
+        self.id_nums = {} # individual id -> number
+        self.cohorts = [] # number -> tuple of individual numbers
+        self.cohort_nums = {} # tuple of individual ids -> number
+        self.sections = {} # name -> array of unsigned ints
+
+    def id_num(self, id):
+        if not id in self.id_nums:
+            self.id_nums[id] = len(self.ids)
+            self.ids.append(id)
+        return self.id_nums[id]
+
+    def cohort_num(self, cohort):
+        key = tuple(cohort)
+        if not key in self.cohort_nums:
+            self.cohort_nums[key] = len(self.cohorts)
+            self.cohorts.append([self.id_num(id) for id in cohort])
+        return self.cohort_nums[key]
+
+    def add_subpeds(self, values, subpeds):
+        """Encodes SubPedigrees (without their source) onto an array"""
+        values.append(len(subpeds))
+        for subped in subpeds:
+            values.append(len(subped.cohorts))
+            values.extend(self.cohort_num(cohort) for cohort in subped.cohorts)
+            mem_ids = subped.mem_ids
+            values.append(len(mem_ids))
+            values.extend(self.id_num(id) for id in mem_ids)
+
+    def write(self, filename, source_options, found, struct, search, positions=None):
+        """
+        Writes a result file for a dictionary of source ids to SubPedigrees,
+        the (cohort, SubPedigrees) found for each cohort (used to update the
+        results when the pedigree changes), the pedigree structure records
+        (id -> (father, mother, sex)) and the search options (dictionary).
+        positions (if given) are the numbers of the found cohorts among all
+        of the IBD cohorts, when only some were searched.
+        """
+        sources = {}
+        for source in source_options.keys():
+            values = array.array("I")
+            self.add_subpeds(values, source_options[source])
+            self.sections["source " + source] = values
+            members = set()
+            for subped in source_options[source]:
+                members.update(subped.members)
+            sizes = [len(subped.members) for subped in source_options[source]]
+            sources[source] = {"ped_count": len(sizes), "total_mems": len(members), \
+                "min_mems": min(sizes) if len(sizes) > 0 else 0}
+
+        values = array.array("I", [len(found)])
+        source_names = []
+        for cohort, subpeds in found:
+            values.append(self.cohort_num(cohort))
+            self.add_subpeds(values, subpeds)
+            values.extend(len(source_names) + i for i in range(len(subpeds)))
+            source_names.extend(subped.source for subped in subpeds)
+        self.sections["found"] = values
+
+        values = array.array("I", [len(struct)])
+        for id, (p_id, m_id, sex) in struct.items():
+            values.extend([self.id_num(id), self.id_num(p_id), self.id_num(m_id), sex])
+        self.sections["struct"] = values
+
+        if positions != None:
+            self.sections["positions"] = array.array("I", positions)
+
+        # written last, once every cohort has a number
+        values = array.array("I", [len(self.cohorts)])
+        for cohort in self.cohorts:
+            values.append(len(cohort))
+            values.extend(cohort)
+        self.sections["cohorts"] = values
+
+        ranges = {}
+        offset = 0
+        for name, values in self.sections.items():
+            ranges[name] = [offset, len(values) * values.itemsize]
+            offset += len(values) * values.itemsize
+        header = json.dumps({"ids": self.ids, "search": search, "sources": sources, \
+            "source_names": source_names, "sections": ranges}).encode()
+
+        out_file = open(filename, "wb")
+        out_file.write(MAGIC)
+        out_file.write(len(header).to_bytes(8, "little"))
+        out_file.write(header)
+        for values in self.sections.values():
+            out_file.write(values.tobytes())
+        out_file.close()
+
+def write_results(filename, source_options, found, struct, search, positions=None):
+    """Writes a result file (see ResultWriter.write)"""
+    ResultWriter().write(filename, source_options, found, struct, search, positions)
+
+class ResultFile:
+    """
+    An open result file. Only the header is read when opened; sections are
+    decoded from the memory-mapped file when asked for. SubPedigrees are
+    returned as (cohorts, mem_ids) pairs of id lists.
+    """
+    def __init__(self, filename):
+        self.in_file = open(filename, "rb")
+        if self.in_file.read(len(MAGIC)) != MAGIC:
+            self.in_file.close()
+            raise ValueError(filename + " is not a ped-cohort result file")
+        header_length = int.from_bytes(self.in_file.read(8), "little")
+        header = json.loads(self.in_file.read(header_length))
+        self.start = len(MAGIC) + 8 + header_length
+        self.data = mmap.mmap(self.in_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.ids = header["ids"]
+        self.search = header["search"] # search options the results were found with
+        self.sources = header["sources"] # source id -> ped_count, total_mems, min_mems
+        self.source_names = header["source_names"]
+        self.ranges = header["sections"]
+        self._cohorts = None
+
+    def section(self, name):
+        """Returns a section as an array of unsigned ints"""
+        offset, length = self.ranges[name]
+        values = array.array("I")
+        values.frombytes(self.data[self.start + offset:self.start + offset + length])
+        return values
+
+    def cohorts(self):
+        """Returns the list of cohorts (lists of ids) that SubPedigrees refer to"""
+        if self._cohorts == None:
+            values = self.section("cohorts")
+            cohorts = []
+            pos = 1
+            for i in range(values[0]):
+                cohorts.append([self.ids[num] for num in values[pos + 1:pos + 1 + values[pos]]])
+                pos += 1 + values[pos]
+            self._cohorts = cohorts
+        return self._cohorts
+
+    def read_subpeds(self, values, pos):
+        """Decodes SubPedigrees from an array, returning them and the next position"""
+        cohorts = self.cohorts()
+        subpeds = []
+        count = values[pos]
+        pos += 1
+        for i in range(count):
+            subped_cohorts = [cohorts[num] for num in values[pos + 1:pos + 1 + values[pos]]]
+            pos += 1 + values[pos]
+            mem_ids = [self.ids[num] for num in values[pos + 1:pos + 1 + values[pos]]]
+            pos += 1 + values[pos]
+            subpeds.append((subped_cohorts, mem_ids))
+        return subpeds, pos
+
+    def source_subpeds(self, source):
+        """Returns the SubPedigrees of a source"""
+        return self.read_subpeds(self.section("source " + source), 0)[0]
+
+    def found(self):
+        """
+        Returns (cohort, [(source, cohorts, mem_ids)]) for
+        each cohort the results were found from
+        """
+        values = self.section("found")
+        cohorts = self.cohorts()
+        found = []
+        pos = 1
+        for i in range(values[0]):
+            cohort = cohorts[values[pos]]
+            subpeds, pos = self.read_subpeds(values, pos + 1)
+            sources = [self.source_names[num] for num in values[pos:pos + len(subpeds)]]
+            pos += len(subpeds)
+            found.append((cohort, [(sources[j],) + subpeds[j] for j in range(len(subpeds))]))
+        return found
+
+    def positions(self):
+        """
+        Returns the numbers of the found cohorts among all of the IBD
+        cohorts, or None if all of them were searched
+        """
+        if not "positions" in self.ranges:
+            return None
+        return list(self.section("positions"))
+
+    def struct(self):
+        """Returns the pedigree structure records (id -> (father, mother, sex))"""
+        values = self.section("struct")
+        records = {}
+        for pos in range(1, 1 + 4 * values[0], 4):
+            records[self.ids[values[pos]]] = (self.ids[values[pos + 1]], \
+                self.ids[values[pos + 2]], values[pos + 3])
+        return records
+
+    def close(self):
+        self.data.close()
+        self.in_file.close()